@@ -1,21 +1,39 @@
-from fastapi import APIRouter, HTTPException, Request
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.db import get_db
+from app.services import metrics
+from app.services.payload_codec import accepts_gzip
 from app.viewmodels.country_viewmodel import CountryViewModel
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import logging
 import json
+import time
 
 router = APIRouter()
 country_vm = CountryViewModel()
 logger = logging.getLogger(__name__)
 
+STREAM_SECONDS = metrics.Histogram("ndjson_stream_seconds", "Duration of /selected-country progress streams", ["outcome"])
+
 @router.get("/countries/")
-async def get_countries():
-    return country_vm.get_all_countries()
+async def get_countries(request: Request):
+    catalog = await country_vm.get_country_catalog()
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"} if catalog.etag else {}
+    if catalog.etag and etag_matches(request.headers.get("if-none-match"), catalog.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(catalog.body, media_type="application/json", headers=headers)
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
 
 @router.get("/selected-country/{country_code}")
-async def selected_country(country_code: str, request: Request):
+async def selected_country(country_code: str, request: Request, db: AsyncSession = Depends(get_db)):
     try:
-        result = await country_vm.get_or_fetch_country_data(country_code)
+        result = await country_vm.get_or_fetch_country_data(db, country_code)
         if "progress_generator" in result:
             return StreamingResponse(stream_generator(result), media_type="application/x-ndjson")
         return JSONResponse(result)
@@ -24,23 +42,89 @@ async def selected_country(country_code: str, request: Request):
         return JSONResponse({"error": f"An error occurred: {str(e)}"}, status_code=500)
 
 async def stream_generator(result):
-    async for progress in result["progress_generator"]:
-        yield json.dumps(progress).encode() + b"\n"
-    yield json.dumps({"country": result["country"], "status": "Complete"}).encode()
+    started = time.perf_counter()
+    outcome = "aborted"
+    try:
+        async for progress in result["progress_generator"]:
+            yield json.dumps(progress).encode() + b"\n"
+        final = {"country": result["country"], "status": "Complete"}
+        profile = metrics.current_profile()
+        if profile is not None:
+            final["profile"] = profile.to_dict()
+        yield json.dumps(final).encode()
+        outcome = "complete"
+    finally:
+        STREAM_SECONDS.observe(time.perf_counter() - started, outcome)
+
+@router.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/api/upstream/stats")
+async def upstream_stats():
+    return country_vm.get_upstream_stats()
 
 @router.get("/api/country/{country_code}")
-async def get_country(country_code: str):
-    country_data = country_vm.get_country_data(country_code)
-    if not country_data:
+async def get_country(country_code: str, request: Request, link_types: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    gzip = accepts_gzip(request.headers.get("accept-encoding"))
+    document = await country_vm.get_country_document(db, country_code, split_link_types(link_types), gzip)
+    if document is None:
         raise HTTPException(status_code=404, detail="Country not found")
-    return country_data
+    return json_stream(document, gzip)
+
+@router.get("/api/country/{country_code}/payloads/{link_type}")
+async def get_country_payload(country_code: str, link_type: str, request: Request, db: AsyncSession = Depends(get_db)):
+    gzip = accepts_gzip(request.headers.get("accept-encoding"))
+    payload = await country_vm.get_country_payload(db, country_code, link_type, gzip)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Payload not found")
+    return json_stream(payload, gzip)
+
+def split_link_types(link_types: Optional[str]):
+    # ?link_types=sectors,indicator selects sections of "data"; omitted means all of them.
+    if link_types is None:
+        return None
+    return [link_type.strip() for link_type in link_types.split(",") if link_type.strip()]
+
+def json_stream(body, gzip: bool) -> StreamingResponse:
+    headers = {"Vary": "Accept-Encoding"}
+    if gzip:
+        # Gzip output passes the stored bytes through without inflating them, so it stays on the event loop;
+        # a sync iterator would cost a threadpool hop per chunk for no CPU work.
+        headers["Content-Encoding"] = "gzip"
+        body = iterate_on_loop(body)
+    # Otherwise the body stays a sync iterator, so Starlette inflates it in a worker thread.
+    return StreamingResponse(body, media_type="application/json", headers=headers)
+
+async def iterate_on_loop(body):
+    for chunk in body:
+        yield chunk
+
+@router.get("/api/country/{country_code}/indicators/{indicator}")
+async def get_country_indicator(country_code: str, indicator: str, start_year: Optional[int] = None, end_year: Optional[int] = None,
+                                db: AsyncSession = Depends(get_db)):
+    return await country_vm.get_indicator_series(db, indicator, country_code, start_year, end_year)
+
+@router.get("/api/indicators/{indicator}")
+async def get_indicator(indicator: str, start_year: Optional[int] = None, end_year: Optional[int] = None,
+                        db: AsyncSession = Depends(get_db)):
+    return await country_vm.get_indicator_series(db, indicator, None, start_year, end_year)
 
 @router.post("/api/country")
-async def save_country(country_data: dict):
-    return country_vm.save_country_data(country_data)
+async def save_country(country_data: dict, request: Request, db: AsyncSession = Depends(get_db)):
+    country = await country_vm.save_country_data(db, country_data)
+    gzip = accepts_gzip(request.headers.get("accept-encoding"))
+    return json_stream(await country_vm.get_country_document(db, country.code, gzip=gzip), gzip)
+
+@router.post("/api/country/{country_code}/refresh")
+async def refresh_country(country_code: str, force: bool = False, db: AsyncSession = Depends(get_db)):
+    summary = await country_vm.refresh_country(db, country_code, force)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Country not found")
+    return {"country": country_code, "refreshed": summary}
 
 @router.delete("/api/country/{country_code}")
-async def delete_country(country_code: str):
-    if country_vm.delete_country(country_code):
+async def delete_country(country_code: str, db: AsyncSession = Depends(get_db)):
+    if await country_vm.delete_country(db, country_code):
         return {"message": "Country deleted successfully"}
     raise HTTPException(status_code=404, detail="Country not found")
\ No newline at end of file
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Float, Integer, String
+from app.database.db import Base
+
+class CatalogSnapshot(Base):
+    __tablename__ = 'catalog_snapshots'
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True)
+    data = Column(String)  # Store JSON data as a string
+    etag = Column(String)
+    fetched_at = Column(Float)  # Unix timestamp of the upstream fetch
@@ -1,4 +1,5 @@
 from sqlalchemy import Column, Integer, String
+from sqlalchemy.orm import relationship
 from app.database.db import Base
 
 class Country(Base):
@@ -7,12 +8,12 @@ class Country(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     code = Column(String, unique=True, index=True)
-    data = Column(String)  # Store JSON data as a string
+    payloads = relationship("CountryPayload", back_populates="country", cascade="all, delete-orphan", order_by="CountryPayload.id")
 
     def to_dict(self):
+        # Payload data is streamed separately (see CountryViewModel.get_country_document) to avoid inflating it all in memory.
         return {
             "id": self.id,
             "name": self.name,
             "code": self.code,
-            "data": self.data
-        }
\ No newline at end of file
+        }
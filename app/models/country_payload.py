@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Float, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy.orm import relationship
+from app.database.db import Base
+
+class CountryPayload(Base):
+    __tablename__ = 'country_payloads'
+    __table_args__ = (UniqueConstraint('country_id', 'link_type'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    country_id = Column(Integer, ForeignKey('countries.id', ondelete='CASCADE'), nullable=False, index=True)
+    link_type = Column(String, nullable=False)
+    payload_hash = Column(String, ForeignKey('payloads.hash'), nullable=False, index=True)
+    etag = Column(String)
+    last_modified = Column(String)
+    fetched_at = Column(Float)  # Unix timestamp of the last time the content changed
+    checked_at = Column(Float, index=True)  # Unix timestamp of the last upstream check, changed or not
+    country = relationship("Country", back_populates="payloads")
+    content = relationship("Payload")
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Float, Index, Integer, String, UniqueConstraint
+from app.database.db import Base
+
+class IndicatorValue(Base):
+    __tablename__ = 'indicator_values'
+    __table_args__ = (
+        UniqueConstraint('country_code', 'indicator', 'year'),
+        Index('ix_indicator_values_indicator_year', 'indicator', 'year'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    country_code = Column(String, nullable=False)
+    indicator = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    value = Column(Float)
+
+    def to_dict(self):
+        return {
+            "country_code": self.country_code,
+            "indicator": self.indicator,
+            "year": self.year,
+            "value": self.value
+        }
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Float, Integer, String, UniqueConstraint
+from app.database.db import Base
+
+class IngestCheckpoint(Base):
+    __tablename__ = 'ingest_checkpoints'
+    __table_args__ = (UniqueConstraint('country_code', 'link_type'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    country_code = Column(String, nullable=False)
+    link_type = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # "done" or "failed"
+    updated_at = Column(Float)  # Unix timestamp
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, LargeBinary, String
+from app.database.db import Base
+
+class Payload(Base):
+    __tablename__ = 'payloads'
+
+    hash = Column(String, primary_key=True)  # sha256 of the JSON text; identical payloads are stored once
+    data = Column(LargeBinary)  # Compressed JSON, see app.services.payload_codec
+    size = Column(Integer)  # Uncompressed size
+    stored_size = Column(Integer)
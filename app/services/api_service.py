@@ -1,51 +1,50 @@
-import requests
-import aiohttp
-import asyncio
 import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from app.services import metrics
+from app.services.http_client import UpstreamResponse, http_client
+from app.services.response_cache import response_cache
+from links import LINK_TTLS
 
 logger = logging.getLogger(__name__)
 
+COUNTRIES_URL = "https://data.worldbank.org/model.json?paths=%5B%5B%22lists%22%2C%22countries%22%2C%22en%22%5D%5D&method=get"
+
 class APIService:
     @staticmethod
     async def fetch_data(url: str, data_type: str) -> Dict[str, Any]:
-        max_retries = 3
-        retry_delay = 1
+        response = await APIService.fetch_response(url, data_type)
+        return {data_type: response.data if response is not None else None}
 
-        async with aiohttp.ClientSession() as session:
-            for attempt in range(max_retries):
-                try:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            content_type = response.headers.get('Content-Type', '').lower()
-                            if 'application/json' in content_type:
-                                data = await response.json()
-                            else:
-                                text = await response.text()
-                                data = json.loads(text)
-                            logger.info(f"Successfully fetched data for {data_type}")
-                            return {data_type: data}
-                        elif response.status == 429:
-                            logger.warning(f"Rate limit hit for {data_type}. Retrying after delay.")
-                            await asyncio.sleep(retry_delay * (attempt + 1))
-                        else:
-                            logger.error(f"Error fetching {data_type} from {url}: Status {response.status}")
-                            response.raise_for_status()
-                except (aiohttp.ClientError, json.JSONDecodeError, asyncio.TimeoutError) as e:
-                    logger.error(f"Error fetching {data_type} from {url}: {str(e)}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (attempt + 1))
-                    else:
-                        return {data_type: None}
+    @staticmethod
+    async def fetch_response(url: str, data_type: str) -> Optional[UpstreamResponse]:
+        response = await response_cache.get_or_fetch(url, LINK_TTLS.get(data_type), lambda: http_client.get_response(url, data_type))
+        if response is not None and response.data is None:
+            with metrics.stage("decode"):
+                response = response._replace(data=json.loads(response.body))
+        return response
 
-        logger.error(f"All retries failed for {data_type} from {url}")
-        return {data_type: None}
+    @staticmethod
+    async def revalidate(url: str, data_type: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Optional[UpstreamResponse]:
+        # Goes around the response cache: the point is to ask upstream whether our copy is still current.
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = await http_client.get_response(url, data_type, headers=headers)
+        if response is not None and response.status == 200:
+            await response_cache.put(url, LINK_TTLS.get(data_type), response)
+        return response
+
+    @staticmethod
+    def get_http_stats() -> Dict[str, Any]:
+        return {**http_client.stats(), "response_cache": response_cache.stats()}
 
     @staticmethod
-    def get_countries():
-        url = "https://data.worldbank.org/model.json?paths=%5B%5B%22lists%22%2C%22countries%22%2C%22en%22%5D%5D&method=get"
-        response = requests.get(url)
-        data = response.json()
+    async def get_countries():
+        data = await http_client.get_json(COUNTRIES_URL, "countries")
+        if data is None:
+            return None
         country_data = [item for item in data["jsonGraph"]["lists"]["countries"]["en"]["value"] if item.get('locationType') == 'country']
         return [(m['name'], m['id']) for m in country_data]
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from app.database.db import SessionLocal
+from app.models.catalog import CatalogSnapshot
+from app.services.api_service import APIService
+
+logger = logging.getLogger(__name__)
+
+CATALOG_NAME = "countries"
+
+class CountryCatalog:
+    def __init__(self, ttl: float = 24 * 60 * 60, retry_interval: float = 60):
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.countries: List[Tuple[str, str]] = []
+        self.body = b"[]"
+        self.etag: Optional[str] = None
+        self.fetched_at: Optional[float] = None
+        self._index: Dict[str, Tuple[str, str]] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._last_attempt: Optional[float] = None
+
+    async def start(self):
+        await self.load_from_db()
+        if self.is_stale():
+            self._schedule_refresh()
+
+    async def get_countries(self) -> List[Tuple[str, str]]:
+        await self._ensure_fresh()
+        return self.countries
+
+    async def resolve(self, query: str) -> Optional[Tuple[str, str]]:
+        await self._ensure_fresh()
+        return self._index.get(query.casefold())
+
+    def is_stale(self) -> bool:
+        return self.fetched_at is None or time.time() - self.fetched_at > self.ttl
+
+    async def refresh(self) -> bool:
+        try:
+            countries = await APIService.get_countries()
+        except (KeyError, TypeError) as e:
+            logger.error(f"Unexpected country catalog payload: {str(e)}")
+            countries = None
+        if not countries:
+            logger.warning("Country catalog refresh failed; keeping the cached catalog")
+            return False
+        self._set(countries, time.time())
+        await self.save_to_db()
+        logger.info(f"Country catalog refreshed with {len(countries)} countries")
+        return True
+
+    async def load_from_db(self):
+        async with SessionLocal() as db:
+            snapshot = await self._get_snapshot(db)
+            if snapshot:
+                self._set([tuple(c) for c in json.loads(snapshot.data)], snapshot.fetched_at)
+                logger.info(f"Loaded {len(self.countries)} countries from the catalog snapshot")
+
+    async def save_to_db(self):
+        async with SessionLocal() as db:
+            snapshot = await self._get_snapshot(db)
+            if not snapshot:
+                snapshot = CatalogSnapshot(name=CATALOG_NAME)
+                db.add(snapshot)
+            snapshot.data = self.body.decode()
+            snapshot.etag = self.etag
+            snapshot.fetched_at = self.fetched_at
+            await db.commit()
+
+    @staticmethod
+    async def _get_snapshot(db):
+        return (await db.execute(select(CatalogSnapshot).where(CatalogSnapshot.name == CATALOG_NAME))).scalars().first()
+
+    async def _ensure_fresh(self):
+        if self.fetched_at is None:
+            # Nothing cached or persisted yet: the caller has to wait for the first load, unless one just failed.
+            if self._refresh_task is None or self._refresh_task.done():
+                if not self._may_retry():
+                    return
+                self._schedule_refresh()
+            # Shielded so one caller going away doesn't cancel the load for everyone else waiting on it.
+            await asyncio.shield(self._refresh_task)
+        elif self.is_stale() and self._may_retry():
+            self._schedule_refresh()
+
+    def _may_retry(self) -> bool:
+        return self._last_attempt is None or time.monotonic() - self._last_attempt > self.retry_interval
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._last_attempt = time.monotonic()
+            self._refresh_task = asyncio.create_task(self.refresh())
+        return self._refresh_task
+
+    def _set(self, countries: List[Tuple[str, str]], fetched_at: float):
+        index = {}
+        for name, code in countries:
+            index.setdefault(name.casefold(), (name, code))
+            index.setdefault(code.casefold(), (name, code))
+        self.countries = countries
+        self.body = json.dumps(countries).encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.fetched_at = fetched_at
+        self._index = index
+
+
+country_catalog = CountryCatalog()
@@ -1,15 +1,33 @@
-from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.database.db import dialect_insert
 from app.models.country import Country
+from app.models.country_payload import CountryPayload
+from app.models.indicator_value import IndicatorValue
+from app.models.payload import Payload
+from app.services.jsongraph import flatten_indicator_data
+from app.services import payload_codec
+import asyncio
+import hashlib
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+INDICATOR_LINK_TYPE = 'indicator'
+BULK_CHUNK_SIZE = 500
+
 class CountryService:
     @staticmethod
-    def get_country(db: Session, country_code: str):
+    async def get_country(db: AsyncSession, country_code: str, with_payloads: bool = False):
         logger.info(f"Querying database for country code: {country_code}")
-        country = db.query(Country).filter(Country.code == country_code).first()
+        query = select(Country).where(Country.code == country_code)
+        if with_payloads:
+            query = query.options(selectinload(Country.payloads))
+        country = (await db.execute(query)).scalars().first()
         if country:
             logger.info(f"Country found in database: {country_code}")
         else:
@@ -17,33 +35,238 @@ class CountryService:
         return country
 
     @staticmethod
-    def create_country(db: Session, country_data: dict):
+    async def create_country(db: AsyncSession, country_data: dict):
         db_country = Country(
             name=country_data['name'],
             code=country_data['code'],
-            data=json.dumps(country_data['data'])
+            payloads=[]
         )
         db.add(db_country)
-        db.commit()
-        db.refresh(db_country)
+        await CountryService._store_payloads(db, db_country, country_data['data'], country_data.get('validators'))
+        await db.commit()
         return db_country
 
     @staticmethod
-    def update_country(db: Session, country: Country, new_data: dict):
-        country.data = json.dumps(new_data)
-        db.commit()
-        db.refresh(country)
+    async def update_country(db: AsyncSession, country: Country, new_data: dict, validators: Optional[dict] = None):
+        # Replaces the country's data as a whole; ingestion and refresh merge through _store_payloads instead.
+        country = await CountryService.get_country(db, country.code, with_payloads=True)
+        country.payloads = [payload for payload in country.payloads if payload.link_type in new_data]
+        if INDICATOR_LINK_TYPE not in new_data:
+            await db.execute(delete(IndicatorValue).where(IndicatorValue.country_code == country.code))
+        await CountryService._store_payloads(db, country, new_data, validators)
+        await db.flush()
+        await CountryService.prune_payloads(db)
+        await db.commit()
         return country
 
     @staticmethod
-    def delete_country(db: Session, country_code: str):
-        country = db.query(Country).filter(Country.code == country_code).first()
+    async def bulk_upsert_countries(db: AsyncSession, countries: List[dict]):
+        # Caller owns the transaction, so a whole batch of countries shares one commit.
+        if not countries:
+            return []
+        rows = [{"name": country_data['name'], "code": country_data['code']} for country_data in countries]
+        await db.execute(dialect_insert(db, Country).values(rows).on_conflict_do_nothing(index_elements=[Country.code]))
+        stored = (await db.execute(
+            select(Country)
+            .where(Country.code.in_([row["code"] for row in rows]))
+            .options(selectinload(Country.payloads))
+        )).scalars().all()
+        by_code = {country.code: country for country in stored}
+        for country_data in countries:
+            await CountryService._store_payloads(db, by_code[country_data['code']], country_data['data'], country_data.get('validators'))
+        return stored
+
+    @staticmethod
+    async def bulk_upsert_payload_contents(db: AsyncSession, contents: Dict[str, bytes]):
+        # contents maps the hash of each payload's JSON text to its payload_codec encoding.
+        rows = [{"hash": digest, "data": blob, "size": payload_codec.uncompressed_size(blob), "stored_size": len(blob)}
+                for digest, blob in contents.items()]
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            statement = dialect_insert(db, Payload).values(rows[start:start + BULK_CHUNK_SIZE])
+            await db.execute(statement.on_conflict_do_nothing(index_elements=[Payload.hash]))
+
+    @staticmethod
+    async def bulk_upsert_indicator_values(db: AsyncSession, rows: List[dict]):
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            statement = dialect_insert(db, IndicatorValue).values(rows[start:start + BULK_CHUNK_SIZE])
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[IndicatorValue.country_code, IndicatorValue.indicator, IndicatorValue.year],
+                set_={"value": statement.excluded.value},
+            ))
+
+    @staticmethod
+    async def store_link_payload(db: AsyncSession, country_code: str, link_type: str, data, validators=(None, None)) -> bool:
+        country = await CountryService.get_country(db, country_code, with_payloads=True)
+        if country is None:
+            return False
+        return bool(await CountryService._store_payloads(db, country, {link_type: data}, {link_type: validators}))
+
+    @staticmethod
+    async def delete_country(db: AsyncSession, country_code: str):
+        country = await CountryService.get_country(db, country_code, with_payloads=True)
         if country:
-            db.delete(country)
-            db.commit()
+            await db.execute(delete(IndicatorValue).where(IndicatorValue.country_code == country_code))
+            await db.delete(country)
+            await db.flush()
+            await CountryService.prune_payloads(db)
+            await db.commit()
             return True
         return False
 
     @staticmethod
-    def get_all_countries(db: Session):
-        return db.query(Country.code, Country.name).all()
\ No newline at end of file
+    async def get_all_countries(db: AsyncSession):
+        return (await db.execute(select(Country.code, Country.name))).all()
+
+    @staticmethod
+    async def get_payload(db: AsyncSession, country_code: str, link_type: str):
+        return (await db.execute(
+            select(Payload.data)
+            .join(CountryPayload, CountryPayload.payload_hash == Payload.hash)
+            .join(Country)
+            .where(Country.code == country_code, CountryPayload.link_type == link_type)
+        )).scalar()
+
+    @staticmethod
+    async def get_payload_blobs(db: AsyncSession, country_id: int, link_types: Optional[List[str]] = None):
+        query = (select(CountryPayload.link_type, Payload.data)
+                 .join(Payload, CountryPayload.payload_hash == Payload.hash)
+                 .where(CountryPayload.country_id == country_id))
+        if link_types is not None:
+            query = query.where(CountryPayload.link_type.in_(link_types))
+        return (await db.execute(query.order_by(CountryPayload.id))).all()
+
+    @staticmethod
+    async def get_indicator_series(db: AsyncSession, indicator: str, country_code: Optional[str] = None,
+                                   start_year: Optional[int] = None, end_year: Optional[int] = None):
+        query = select(IndicatorValue).where(IndicatorValue.indicator == indicator)
+        if country_code is not None:
+            query = query.where(IndicatorValue.country_code == country_code)
+        if start_year is not None:
+            query = query.where(IndicatorValue.year >= start_year)
+        if end_year is not None:
+            query = query.where(IndicatorValue.year <= end_year)
+        return (await db.execute(query.order_by(IndicatorValue.country_code, IndicatorValue.year))).scalars().all()
+
+    @staticmethod
+    async def touch_payload(db: AsyncSession, country_code: str, link_type: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        payload = (await db.execute(
+            select(CountryPayload)
+            .join(Country)
+            .where(Country.code == country_code, CountryPayload.link_type == link_type)
+        )).scalars().first()
+        if payload is not None:
+            payload.etag = etag or payload.etag
+            payload.last_modified = last_modified or payload.last_modified
+            payload.checked_at = time.time()
+
+    @staticmethod
+    async def _store_payloads(db: AsyncSession, country: Country, data: dict, validators: Optional[dict] = None):
+        # Returns the link types whose content actually changed; unchanged ones only get their validators and checked_at bumped.
+        now = time.time()
+        validators = validators or {}
+        # Serializing and compressing multi-megabyte payloads is CPU-bound, so it runs off the event loop.
+        serialized = await asyncio.to_thread(CountryService._serialize, data)
+        payloads = {payload.link_type: payload for payload in country.payloads}
+        changed = [link_type for link_type, (_, digest) in serialized.items()
+                   if link_type not in payloads or payloads[link_type].payload_hash != digest]
+        await CountryService.bulk_upsert_payload_contents(db, {serialized[link_type][1]: serialized[link_type][0] for link_type in changed})
+
+        for link_type, (_, digest) in serialized.items():
+            payload = payloads.get(link_type)
+            if payload is None:
+                payload = CountryPayload(link_type=link_type)
+                country.payloads.append(payload)
+            if link_type in changed:
+                payload.payload_hash = digest
+                payload.fetched_at = now
+            payload.etag, payload.last_modified = validators.get(link_type, (None, None))
+            payload.checked_at = now
+
+        if INDICATOR_LINK_TYPE in changed:
+            await CountryService._store_indicator_values(db, country.code, data[INDICATOR_LINK_TYPE])
+        return changed
+
+    @staticmethod
+    def _serialize(data: dict):
+        serialized = {}
+        for link_type, payload_data in data.items():
+            text = json.dumps(payload_data).encode()
+            serialized[link_type] = (payload_codec.encode(text), hashlib.sha256(text).hexdigest())
+        return serialized
+
+    @staticmethod
+    async def migrate_legacy_data(db: AsyncSession, batch_size: int = 50):
+        """
+        Move JSON blobs left in the pre-payload `countries.data` column into payloads and indicator rows.
+        :param db: Session; committed once per batch so an interrupted migration resumes where it stopped
+        :return: The number of countries migrated
+        """
+        columns = await db.run_sync(lambda session: [column["name"] for column in inspect(session.connection()).get_columns("countries")])
+        if "data" not in columns:
+            return 0
+        migrated = last_id = 0
+        while True:
+            rows = (await db.execute(
+                text("SELECT id, code, data FROM countries WHERE data IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            )).all()
+            if not rows:
+                break
+            for country_id, country_code, data in rows:
+                last_id = country_id
+                try:
+                    legacy_data = json.loads(data)
+                except ValueError as e:
+                    # Left in place rather than discarded; it is reported again on the next startup.
+                    logger.error(f"Skipping unreadable legacy data for {country_code}: {str(e)}")
+                    continue
+                if isinstance(legacy_data, dict) and legacy_data:
+                    country = await CountryService.get_country(db, country_code, with_payloads=True)
+                    await CountryService._store_payloads(db, country, legacy_data)
+                    migrated += 1
+                await db.execute(text("UPDATE countries SET data = NULL WHERE id = :id"), {"id": country_id})
+            await db.commit()
+        if migrated:
+            logger.info(f"Migrated legacy data for {migrated} countries")
+        return migrated
+
+    @staticmethod
+    async def prune_payloads(db: AsyncSession):
+        referenced = select(CountryPayload.payload_hash)
+        result = await db.execute(delete(Payload).where(Payload.hash.not_in(referenced)))
+        return result.rowcount
+
+    @staticmethod
+    async def get_storage_stats(db: AsyncSession):
+        unique_payloads, unique_bytes, stored_bytes = (await db.execute(
+            select(func.count(Payload.hash), func.coalesce(func.sum(Payload.size), 0), func.coalesce(func.sum(Payload.stored_size), 0))
+        )).one()
+        references, referenced_bytes = (await db.execute(
+            select(func.count(CountryPayload.id), func.coalesce(func.sum(Payload.size), 0))
+            .join(Payload, CountryPayload.payload_hash == Payload.hash)
+        )).one()
+        return {
+            "payload_references": references,
+            "unique_payloads": unique_payloads,
+            "stored_bytes": stored_bytes,
+            "uncompressed_bytes": unique_bytes,
+            "bytes_without_dedup": referenced_bytes,
+            "compression_ratio": round(unique_bytes / stored_bytes, 2) if stored_bytes else None,
+        }
+
+    @staticmethod
+    async def _store_indicator_values(db: AsyncSession, country_code: str, payload):
+        await db.execute(delete(IndicatorValue).where(IndicatorValue.country_code == country_code))
+        rows = await asyncio.to_thread(CountryService._indicator_rows, country_code, payload)
+        await CountryService.bulk_upsert_indicator_values(db, rows)
+        logger.info(f"Stored {len(rows)} indicator values for {country_code}")
+
+    @staticmethod
+    def _indicator_rows(country_code: str, payload) -> List[dict]:
+        # Keyed on the unique columns: a repeated (indicator, year) would make one upsert statement hit the same row twice.
+        rows = {
+            (indicator, year): {"country_code": country_code, "indicator": indicator, "year": year, "value": value}
+            for payload_code, indicator, year, value in flatten_indicator_data(payload)
+            if payload_code.casefold() == country_code.casefold()
+        }
+        return list(rows.values())
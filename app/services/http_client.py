@@ -0,0 +1,254 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+UPSTREAM_LATENCY = metrics.Histogram("upstream_request_seconds", "Upstream request latency, including the body read",
+                                     ["link_type", "host", "status"])
+
+
+class UpstreamResponse(NamedTuple):
+    status: int
+    body: bytes
+    data: Any  # Decoded JSON; None for 304s and for bodies served from cache
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        # Upstream told us to back off: hold every request to this host, not just the one that got the 429.
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class HostSemaphores:
+    """Caps requests in flight per upstream host; a semaphore is created the first time a host is seen."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def for_url(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.limit)
+        return self._semaphores[host]
+
+
+class HTTPClient:
+    def __init__(self, limit: int = 100, limit_per_host: int = 8, dns_ttl: int = 300,
+                 keepalive_timeout: float = 30, connect_timeout: float = 10, read_timeout: float = 60,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_cap: float = 30.0,
+                 rate_per_host: Optional[float] = 10.0, burst_per_host: int = 20):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rate_per_host = rate_per_host
+        self.burst_per_host = burst_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats = defaultdict(lambda: defaultdict(int))
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_created)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, trace_configs=[trace_config])
+            logger.info("HTTP client session started")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client session closed")
+        self._session = None
+
+    async def get_json(self, url: str, data_type: str) -> Optional[Any]:
+        response = await self.get_response(url, data_type)
+        return response.data if response is not None else None
+
+    async def get_response(self, url: str, data_type: str, headers: Optional[Dict[str, str]] = None) -> Optional[UpstreamResponse]:
+        # Keeps the raw body and validators alongside the decoded JSON so callers can cache and revalidate without re-serializing.
+        session = await self.start()
+        host = urlsplit(url).netloc
+        stats = self._stats[host]
+
+        for attempt in range(self.max_retries):
+            if attempt:
+                stats["retries"] += 1
+            with metrics.stage("upstream.rate_limit"):
+                await self._acquire(host)
+            stats["requests"] += 1
+            started = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers, trace_request_ctx={"host": host}) as response:
+                    body = await response.read() if response.status == 200 else b""
+                    elapsed = time.perf_counter() - started
+                    UPSTREAM_LATENCY.observe(elapsed, data_type, host, str(response.status))
+                    metrics.record("upstream.request", elapsed)
+                    if response.status == 200:
+                        stats["bytes_received"] += len(body)
+                        with metrics.stage("decode"):
+                            data = json.loads(body)
+                        logger.info(f"Successfully fetched data for {data_type}")
+                        return UpstreamResponse(200, body, data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                    if response.status == 304:
+                        stats["not_modified"] += 1
+                        logger.info(f"Not modified: {data_type}")
+                        return UpstreamResponse(304, b"", None, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                    if response.status not in RETRYABLE_STATUSES:
+                        stats["errors"] += 1
+                        logger.error(f"Error fetching {data_type} from {url}: Status {response.status}")
+                        return None
+                    retry_after = self._parse_retry_after(response.headers.get("Retry-After"))
+                    if response.status == 429:
+                        stats["rate_limited"] += 1
+                        metrics.note("upstream.rate_limited")
+                        logger.warning(f"Rate limit hit for {data_type}. Retrying after delay.")
+                        if retry_after is not None and host in self._buckets:
+                            self._buckets[host].pause(retry_after)
+                    else:
+                        logger.warning(f"Upstream error for {data_type}: Status {response.status}")
+            except (aiohttp.ClientError, json.JSONDecodeError, asyncio.TimeoutError) as e:
+                stats["errors"] += 1
+                retry_after = None
+                logger.error(f"Error fetching {data_type} from {url}: {str(e)}")
+
+            if attempt < self.max_retries - 1:
+                with metrics.stage("upstream.backoff"):
+                    await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        logger.error(f"All retries failed for {data_type} from {url}")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        hosts = {host: dict(counters) for host, counters in self._stats.items()}
+        created = sum(c.get("connections_created", 0) for c in hosts.values())
+        reused = sum(c.get("connections_reused", 0) for c in hosts.values())
+        pool = {"limit": self.limit, "limit_per_host": self.limit_per_host, "idle": 0, "acquired": 0}
+        if self._session is not None and not self._session.closed:
+            connector = self._session.connector
+            # aiohttp has no public pool introspection; fall back to zeros if the internals move.
+            pool["idle"] = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            pool["acquired"] = len(getattr(connector, "_acquired", ()))
+        return {
+            "pool": pool,
+            "connection_reuse_rate": reused / (created + reused) if created + reused else None,
+            "hosts": hosts,
+        }
+
+    def totals(self) -> Dict[str, int]:
+        totals = defaultdict(int)
+        for counters in self._stats.values():
+            for name, value in counters.items():
+                totals[name] += value
+        return dict(totals)
+
+    async def _acquire(self, host: str):
+        if not self.rate_per_host:
+            return
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate_per_host, self.burst_per_host)
+        await self._buckets[host].acquire()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter keeps parallel retries from lining up into another burst.
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay += min(retry_after, self.backoff_cap)
+        return delay
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    async def _on_connection_created(self, session, context, params):
+        self._stats[self._trace_host(context)]["connections_created"] += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self._stats[self._trace_host(context)]["connections_reused"] += 1
+
+    @staticmethod
+    def _trace_host(context) -> str:
+        request_ctx = getattr(context, "trace_request_ctx", None) or {}
+        return request_ctx.get("host", "unknown")
+
+
+def _register_metrics(client: HTTPClient):
+    # Exported from the client's own per-host counters rather than counted twice on the request path.
+    def per_host(counter: str):
+        return lambda: [((host,), counters.get(counter, 0)) for host, counters in list(client._stats.items())]
+
+    for name, counter, description in (
+        ("upstream_requests_total", "requests", "Upstream request attempts"),
+        ("upstream_bytes_total", "bytes_received", "Upstream response bytes downloaded"),
+        ("upstream_retries_total", "retries", "Upstream retries"),
+        ("upstream_rate_limited_total", "rate_limited", "Upstream 429 responses"),
+        ("upstream_errors_total", "errors", "Upstream errors and non-retryable statuses"),
+        ("upstream_not_modified_total", "not_modified", "Upstream 304 responses to conditional requests"),
+        ("upstream_connections_created_total", "connections_created", "New upstream connections opened"),
+        ("upstream_connections_reused_total", "connections_reused", "Pooled upstream connections reused"),
+    ):
+        metrics.Collected(name, description, "counter", ["host"], per_host(counter))
+
+
+http_client = HTTPClient()
+_register_metrics(http_client)
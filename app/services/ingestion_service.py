@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import delete, select
+from app.database.db import SessionLocal, dialect_insert
+from app.models.ingest_checkpoint import IngestCheckpoint
+from app.services.api_service import APIService
+from app.services.catalog_service import country_catalog
+from app.services.country_service import CountryService
+from app.services.http_client import HostSemaphores, http_client
+from app.services.response_cache import response_cache
+from links import LINK_TEMPLATES, get_url
+
+logger = logging.getLogger(__name__)
+
+DONE = "done"
+FAILED = "failed"
+
+
+class CheckpointService:
+    @staticmethod
+    async def get_done(db, link_types: Iterable[str]) -> Set[Tuple[str, str]]:
+        rows = (await db.execute(
+            select(IngestCheckpoint.country_code, IngestCheckpoint.link_type)
+            .where(IngestCheckpoint.status == DONE, IngestCheckpoint.link_type.in_(list(link_types)))
+        )).all()
+        return {(code, link_type) for code, link_type in rows}
+
+    @staticmethod
+    async def mark_many(db, entries: List[Tuple[str, str, str]]):
+        # One upsert for the whole batch instead of a SELECT per checkpoint.
+        if not entries:
+            return
+        now = time.time()
+        statement = dialect_insert(db, IngestCheckpoint).values([
+            {"country_code": code, "link_type": link_type, "status": status, "updated_at": now}
+            for code, link_type, status in entries
+        ])
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[IngestCheckpoint.country_code, IngestCheckpoint.link_type],
+            set_={"status": statement.excluded.status, "updated_at": statement.excluded.updated_at},
+        ))
+
+    @staticmethod
+    async def clear(db):
+        await db.execute(delete(IngestCheckpoint))
+        await db.commit()
+
+
+class IngestionPipeline:
+    def __init__(self, concurrency: int = 16, per_host_limit: int = 8, batch_size: int = 50,
+                 link_types: Optional[List[str]] = None):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.link_types = link_types or list(LINK_TEMPLATES)
+        self.host_limits = HostSemaphores(per_host_limit)
+
+    async def select_countries(self, queries: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+        if not queries:
+            return list(await country_catalog.get_countries())
+        countries = []
+        for query in queries:
+            country = await country_catalog.resolve(query)
+            if country is None:
+                logger.warning(f"Skipping unknown country: {query}")
+            elif country not in countries:
+                countries.append(country)
+        return countries
+
+    async def run(self, countries: List[Tuple[str, str]], restart: bool = False) -> Dict[str, float]:
+        async with SessionLocal() as db:
+            if restart:
+                await CheckpointService.clear(db)
+            done = await CheckpointService.get_done(db, self.link_types)
+
+        work = [(name, code, link_type) for name, code in countries for link_type in self.link_types
+                if (code, link_type) not in done]
+        logger.info(f"Ingesting {len(work)} payloads for {len(countries)} countries ({len(done)} already checkpointed)")
+
+        http_before = http_client.totals()
+        cache_before = response_cache.stats()
+        start = time.perf_counter()
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        writer = asyncio.create_task(self._write_batches(results))
+        global_limit = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(name: str, code: str, link_type: str):
+            async with global_limit:
+                url = get_url(link_type, code)
+                async with self.host_limits.for_url(url):
+                    response = await APIService.fetch_response(url, link_type)
+            await results.put((name, code, link_type, response))
+
+        fetches = asyncio.gather(*(fetch(*item) for item in work))
+        try:
+            finished, _ = await asyncio.wait({fetches, writer}, return_when=asyncio.FIRST_COMPLETED)
+            if writer in finished:
+                # The writer only returns after the sentinel, so finishing early means a failed commit.
+                writer.result()
+            await fetches
+            await results.put(None)
+            written, failed = await writer
+        finally:
+            # Also reached when run() itself is cancelled: stop fetching and committing, and collect both outcomes.
+            fetches.cancel()
+            writer.cancel()
+            await asyncio.gather(fetches, writer, return_exceptions=True)
+
+        elapsed = time.perf_counter() - start
+        http_after = http_client.totals()
+        cache_after = response_cache.stats()
+        requests = http_after.get("requests", 0) - http_before.get("requests", 0)
+        async with SessionLocal() as db:
+            storage = await CountryService.get_storage_stats(db)
+        return {
+            "countries": len(countries),
+            "payloads_skipped": len(countries) * len(self.link_types) - len(work),
+            "payloads_written": written,
+            "payloads_failed": failed,
+            "elapsed_s": round(elapsed, 3),
+            "requests": requests,
+            "requests_per_s": round(requests / elapsed, 2) if elapsed else 0.0,
+            "bytes": http_after.get("bytes_received", 0) - http_before.get("bytes_received", 0),
+            "retries": http_after.get("retries", 0) - http_before.get("retries", 0),
+            "rate_limited": http_after.get("rate_limited", 0) - http_before.get("rate_limited", 0),
+            "cache": {name: cache_after.get(name, 0) - cache_before.get(name, 0)
+                      for name in ("memory_hits", "disk_hits", "coalesced", "misses")},
+            "storage": storage,
+        }
+
+    async def _write_batches(self, results: asyncio.Queue) -> Tuple[int, int]:
+        written = failed = 0
+        batch = []
+        while True:
+            item = await results.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= self.batch_size):
+                batch_written, batch_failed = await self._write_batch(batch)
+                written += batch_written
+                failed += batch_failed
+                batch = []
+            if item is None:
+                return written, failed
+
+    async def _write_batch(self, batch) -> Tuple[int, int]:
+        by_country: Dict[Tuple[str, str], dict] = {}
+        failures = []
+        for name, code, link_type, response in batch:
+            if response is None:
+                failures.append((code, link_type))
+            else:
+                country_data = by_country.setdefault((name, code), {"name": name, "code": code, "data": {}, "validators": {}})
+                country_data["data"][link_type] = response.data
+                country_data["validators"][link_type] = (response.etag, response.last_modified)
+
+        checkpoints = [(code, link_type, DONE) for (_, code), country_data in by_country.items() for link_type in country_data["data"]]
+        checkpoints += [(code, link_type, FAILED) for code, link_type in failures]
+        async with SessionLocal() as db:
+            try:
+                await CountryService.bulk_upsert_countries(db, list(by_country.values()))
+                await CheckpointService.mark_many(db, checkpoints)
+                await db.flush()
+                await CountryService.prune_payloads(db)
+                # Payloads and their checkpoints commit together, so a killed run never skips unwritten data.
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+        written = len(batch) - len(failures)
+        logger.info(f"Committed batch of {written} payloads ({len(failures)} failed)")
+        return written, len(failures)
@@ -0,0 +1,36 @@
+from typing import Any, Iterator, Optional, Tuple
+
+
+def unwrap(node: Any) -> Any:
+    # Falcor jsonGraph wraps leaf values as {"$type": "atom", "value": ...}; a missing value is an atom without one.
+    if isinstance(node, dict) and "$type" in node:
+        return node.get("value")
+    return node
+
+
+def flatten_indicator_data(payload: Any) -> Iterator[Tuple[str, str, int, Optional[float]]]:
+    """
+    Flatten an `indicatorData` jsonGraph response into (country_code, indicator, year, value) rows.
+    :param payload: The decoded response of the 'indicator' link type
+    :return: An iterator of rows, skipping years without a numeric value
+    """
+    indicator_data = ((payload or {}).get("jsonGraph") or {}).get("indicatorData") or {}
+    for country_code, indicators in indicator_data.items():
+        for indicator, series in (unwrap(indicators) or {}).items():
+            for year, value in _series_items(unwrap(series)):
+                value = unwrap(value)
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                yield country_code, indicator, year, float(value)
+
+
+def _series_items(series: Any) -> Iterator[Tuple[int, Any]]:
+    # The {"from": ..., "to": ...} range in the request path comes back keyed by year, but tolerate record lists too.
+    if isinstance(series, dict):
+        for year, value in series.items():
+            if str(year).isdigit():
+                yield int(year), value
+    elif isinstance(series, list):
+        for record in series:
+            if isinstance(record, dict) and str(record.get("date", record.get("year", ""))).isdigit():
+                yield int(record.get("date", record.get("year"))), record.get("value")
@@ -0,0 +1,203 @@
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs
+
+# Metrics are in-process counters rendered in the Prometheus text format at /metrics.
+# With METRICS_ENABLED=0 every observe() returns immediately and the DB hooks are never installed.
+ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LabelValues = Tuple[str, ...]
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self) -> Iterable[str]:
+        return []
+
+    def _labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: one non-cumulative count per bucket plus +Inf, then the sum.
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        if not ENABLED:
+            return
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                yield f"{self.name}_bucket{self._labels(values, le)} {cumulative}"
+            yield f"{self.name}_sum{self._labels(values)} {series[-1]}"
+            yield f"{self.name}_count{self._labels(values)} {cumulative}"
+
+
+class Collected(Metric):
+    # Read from state another component already keeps (e.g. HTTPClient counters), so the hot path pays nothing.
+    def __init__(self, name: str, description: str, kind: str, labels: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        super().__init__(name, description, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        for values, value in self.collect():
+            if value is not None:
+                yield f"{self.name}{self._labels(values)} {value}"
+
+
+REGISTRY: List[Metric] = []
+
+
+def render() -> str:
+    if not ENABLED:
+        return "# metrics disabled (METRICS_ENABLED=0)\n"
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Profile:
+    """Stage timings for one request, collected while a profiled request is in flight."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.events: Dict[str, int] = defaultdict(int)
+
+    def add(self, name: str, seconds: float):
+        stage = self.stages[name]
+        stage[0] += 1
+        stage[1] += seconds
+
+    def to_dict(self):
+        # Stages run concurrently (one fetch per link type), so they can sum to more than total_ms.
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages": {name: {"count": count, "ms": round(seconds * 1000, 2)} for name, (count, seconds) in self.stages.items()},
+            "events": dict(self.events),
+        }
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, (_, seconds) in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+class _Stage:
+    __slots__ = ("profile", "name", "started")
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.add(self.name, time.perf_counter() - self.started)
+
+
+_current_profile: ContextVar[Optional[Profile]] = ContextVar("profile", default=None)
+_NOT_PROFILING = nullcontext()
+
+
+def current_profile() -> Optional[Profile]:
+    return _current_profile.get()
+
+
+def stage(name: str):
+    """
+    Time a block as a stage of the current request's profile.
+    :param name: Stage name; repeated stages accumulate
+    :return: A context manager, a shared no-op unless the request asked for profiling
+    """
+    profile = _current_profile.get()
+    return _Stage(profile, name) if profile is not None else _NOT_PROFILING
+
+
+def record(name: str, seconds: float):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+
+def note(event: str):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.events[event] += 1
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request profiling: send `X-Profile: 1` or `?profile=1`.
+    The stage breakdown comes back in a Server-Timing header; NDJSON streams also append it to their last line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            return await self.app(scope, receive, send)
+
+        profile = Profile()
+        token = _current_profile.set(profile)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(b"server-timing", profile.server_timing().encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+
+    @staticmethod
+    def _wants_profile(scope) -> bool:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                return value.strip().lower() in (b"1", b"true", b"yes")
+        query = scope.get("query_string", b"")
+        return b"profile=" in query and parse_qs(query.decode()).get("profile", [""])[0].lower() in ("1", "true", "yes")
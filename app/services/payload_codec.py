@@ -0,0 +1,157 @@
+import struct
+import zlib
+from typing import Iterable, Iterator, Optional, Union
+
+# Stored payload layout: one format byte, then a format-specific body.
+# Format 1: big-endian CRC-32 and length of the uncompressed JSON, then a raw deflate stream
+# ended with a sync flush instead of a final block. Such streams can be concatenated into
+# one valid deflate stream, which is what lets stored payloads go out as gzip untouched.
+FORMAT_DEFLATE = 1
+HEADER = struct.Struct(">BII")
+COMPRESSION_LEVEL = 6
+CHUNK_SIZE = 64 * 1024
+# Inflated response chunks are larger: each one costs a threadpool hop when streamed, so fewer is cheaper.
+DOCUMENT_CHUNK_SIZE = 1024 * 1024
+
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def encode(text: bytes, level: int = COMPRESSION_LEVEL) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(text) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return HEADER.pack(FORMAT_DEFLATE, zlib.crc32(text), len(text)) + body
+
+
+def decode(blob: bytes) -> bytes:
+    return b"".join(iter_decode(blob))
+
+
+def iter_decode(blob: bytes, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Inflate a stored payload a bounded chunk at a time.
+    :param blob: A payload produced by encode()
+    :param chunk_size: Maximum size of each yielded chunk
+    :return: An iterator over the uncompressed JSON
+    """
+    _check_format(blob)
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    view = memoryview(blob)
+    for start in range(HEADER.size, len(blob), chunk_size):
+        chunk = decompressor.decompress(view[start:start + chunk_size], chunk_size)
+        while True:
+            if chunk:
+                yield chunk
+            if not decompressor.unconsumed_tail:
+                break
+            chunk = decompressor.decompress(decompressor.unconsumed_tail, chunk_size)
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def uncompressed_size(blob: bytes) -> int:
+    _check_format(blob)
+    return HEADER.unpack_from(blob)[2]
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    explicit, wildcard = None, None
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        quality = _quality(params.strip().lower().removeprefix("q=")) if params else 1.0
+        name = name.strip().lower()
+        if name in ("gzip", "x-gzip"):
+            explicit = max(explicit or 0.0, quality)
+        elif name == "*":
+            wildcard = max(wildcard or 0.0, quality)
+    # An explicit gzip entry, including gzip;q=0, overrides whatever "*" says.
+    quality = explicit if explicit is not None else wildcard
+    return quality is not None and quality > 0
+
+
+def iter_document(parts: Iterable[Union[str, bytes]], gzip: bool) -> Iterator[bytes]:
+    """
+    Render a JSON document from literal fragments and stored payloads.
+    :param parts: JSON text fragments (str) interleaved with stored payloads (bytes, from encode())
+    :param gzip: Emit a gzip stream, passing stored payloads through without inflating them
+    :return: An iterator over response body chunks
+    """
+    if not gzip:
+        for part in parts:
+            if isinstance(part, str):
+                yield part.encode()
+            else:
+                yield from iter_decode(part, DOCUMENT_CHUNK_SIZE)
+        return
+
+    yield GZIP_HEADER
+    crc = length = 0
+    for part in parts:
+        if isinstance(part, str):
+            text = part.encode()
+            compressor = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS)
+            yield compressor.compress(text) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            crc = zlib.crc32(text, crc)
+            length += len(text)
+        else:
+            _check_format(part)
+            _, part_crc, part_length = HEADER.unpack_from(part)
+            yield memoryview(part)[HEADER.size:]
+            crc = crc32_combine(crc, part_crc, part_length)
+            length += part_length
+    yield zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH)
+    yield struct.pack("<II", crc, length & 0xFFFFFFFF)
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    # CRC-32 of A+B from CRC(A), CRC(B) and len(B), as zlib's crc32_combine: shift CRC(A) past len(B) zero bytes.
+    for operator in ZERO_BYTE_OPERATORS:
+        if not length2:
+            break
+        if length2 & 1:
+            crc1 = _gf2_times(operator, crc1)
+        length2 >>= 1
+    return crc1 ^ crc2
+
+
+def _zero_byte_operators():
+    # GF(2) operators appending 2**i zero bytes to a CRC register. The one-zero-bit operator
+    # squared three times appends a byte; each further squaring doubles the length.
+    operator = [0xEDB88320] + [1 << n for n in range(31)]
+    for _ in range(3):
+        operator = _gf2_square(operator)
+    operators = []
+    for _ in range(64):
+        operators.append(operator)
+        operator = _gf2_square(operator)
+    return operators
+
+
+def _gf2_times(matrix, vector: int) -> int:
+    total = 0
+    for row in matrix:
+        if not vector:
+            break
+        if vector & 1:
+            total ^= row
+        vector >>= 1
+    return total
+
+
+def _gf2_square(matrix):
+    return [_gf2_times(matrix, row) for row in matrix]
+
+
+def _quality(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _check_format(blob: bytes):
+    if not blob or blob[0] != FORMAT_DEFLATE:
+        raise ValueError(f"Unsupported payload format: {blob[0] if blob else None}")
+
+
+ZERO_BYTE_OPERATORS = _zero_byte_operators()
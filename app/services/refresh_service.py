@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_, select
+from app.database.db import SessionLocal
+from app.models.country import Country
+from app.models.country_payload import CountryPayload
+from app.services.api_service import APIService
+from app.services.country_service import CountryService
+from app.services.response_cache import normalize_url
+from links import LINK_TTLS, get_url
+
+logger = logging.getLogger(__name__)
+
+NOT_MODIFIED = "not_modified"
+UNCHANGED = "unchanged"
+UPDATED = "updated"
+FAILED = "failed"
+
+
+class RefreshService:
+    def __init__(self, budget: int = 100, concurrency: int = 8):
+        self.budget = budget
+        self.concurrency = concurrency
+
+    @staticmethod
+    async def find_stale(db, limit: int, country_code: Optional[str] = None, force: bool = False):
+        now = time.time()
+        query = (select(Country.code, CountryPayload.link_type, CountryPayload.etag, CountryPayload.last_modified)
+                 .join(CountryPayload.country))
+        if not force:
+            query = query.where(or_(
+                CountryPayload.checked_at.is_(None),
+                *(and_(CountryPayload.link_type == link_type, CountryPayload.checked_at < now - ttl)
+                  for link_type, ttl in LINK_TTLS.items())
+            ))
+        if country_code is not None:
+            query = query.where(Country.code == country_code)
+        return (await db.execute(query.order_by(CountryPayload.checked_at.asc().nulls_first()).limit(limit))).all()
+
+    async def refresh(self, country_code: Optional[str] = None, force: bool = False, budget: Optional[int] = None) -> Dict[str, int]:
+        """
+        Revalidate stale payloads oldest-first and rewrite only the ones whose content changed.
+        :param country_code: Limit the refresh to one country
+        :param force: Revalidate regardless of staleness
+        :param budget: Maximum upstream requests to spend; defaults to the service budget
+        :return: Counts per outcome (not_modified, unchanged, updated, failed)
+        """
+        budget = budget or self.budget
+        async with SessionLocal() as db:
+            stale = await self.find_stale(db, budget, country_code, force)
+        if not stale:
+            return {}
+
+        # Payloads behind the same URL and validators (e.g. global meta links) share one conditional request.
+        groups: Dict[Tuple[str, Optional[str], Optional[str]], Tuple[str, List[Tuple[str, str]]]] = {}
+        for code, link_type, etag, last_modified in stale:
+            url = get_url(link_type, code)
+            groups.setdefault((normalize_url(url), etag, last_modified), (url, []))[1].append((code, link_type))
+
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def revalidate(key, url, rows):
+            _, etag, last_modified = key
+            async with limit:
+                response = await APIService.revalidate(url, rows[0][1], etag, last_modified)
+            return rows, response
+
+        results = await asyncio.gather(*(revalidate(key, url, rows) for key, (url, rows) in groups.items()))
+        summary = await self._apply(results)
+        logger.info(f"Refreshed {len(stale)} payloads with {len(groups)} upstream requests: {dict(summary)}")
+        return dict(summary)
+
+    @staticmethod
+    async def _apply(results) -> Counter:
+        summary = Counter()
+        async with SessionLocal() as db:
+            try:
+                for rows, response in results:
+                    for code, link_type in rows:
+                        if response is None:
+                            # Still counts as checked, so a persistently failing URL can't starve the rest of the queue.
+                            await CountryService.touch_payload(db, code, link_type)
+                            summary[FAILED] += 1
+                        elif response.status == 304:
+                            await CountryService.touch_payload(db, code, link_type, response.etag, response.last_modified)
+                            summary[NOT_MODIFIED] += 1
+                        elif await CountryService.store_link_payload(db, code, link_type, response.data, (response.etag, response.last_modified)):
+                            summary[UPDATED] += 1
+                        else:
+                            summary[UNCHANGED] += 1
+                await db.flush()
+                await CountryService.prune_payloads(db)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        return summary
+
+
+class RefreshScheduler:
+    def __init__(self, service: RefreshService, interval: float = 5 * 60, enabled: bool = True):
+        self.service = service
+        self.interval = interval
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.service.refresh()
+            except Exception as e:
+                logger.error(f"Background refresh failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+refresh_service = RefreshService()
+refresh_scheduler = RefreshScheduler(
+    refresh_service, enabled=os.getenv("REFRESH_SCHEDULER_ENABLED", "1").lower() not in ("0", "false", "no"))
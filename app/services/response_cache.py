@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from app.services import metrics
+from app.services.http_client import UpstreamResponse
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    hash: str
+    body: bytes
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def to_response(self) -> UpstreamResponse:
+        return UpstreamResponse(200, self.body, None, self.etag, self.last_modified)
+
+
+def normalize_url(url: str) -> str:
+    # Query parameter order carries no meaning for the World Bank APIs, so identical requests spelled differently share an entry.
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, memory_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = ".cache/responses",
+                 disk_bytes: int = 1024 * 1024 * 1024, default_ttl: float = 60 * 60):
+        self.enabled = True
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.default_ttl = default_ttl
+        self._memory: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._memory_size = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = Counter()
+        # Bytes under disk_dir (index and blobs), counted once per directory and then kept up to date by writes.
+        self._disk_size: Optional[int] = None
+        self._disk_size_dir: Optional[str] = None
+        self._disk_lock = threading.Lock()
+
+    async def get_or_fetch(self, url: str, ttl: Optional[float],
+                           loader: Callable[[], Awaitable[Optional[UpstreamResponse]]]) -> Optional[UpstreamResponse]:
+        """
+        Return the response for a URL, from memory, disk, an identical in-flight request, or the loader.
+        :param url: The upstream URL; normalized before use as the cache key
+        :param ttl: Seconds the response stays fresh, or None for the cache default
+        :param loader: Coroutine factory fetching the response upstream
+        :return: The response (its data is None when served from cache); None if the upstream fetch failed
+        """
+        if not self.enabled:
+            return await loader()
+
+        key = normalize_url(url)
+        entry = self._get_memory(key)
+        if entry is not None:
+            self._stats["memory_hits"] += 1
+            return entry.to_response()
+
+        if key in self._inflight:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result = None
+        try:
+            entry = await asyncio.to_thread(self._read_disk, key) if self.disk_dir else None
+            if entry is not None:
+                self._stats["disk_hits"] += 1
+                self._put_memory(key, entry)
+                result = entry.to_response()
+            else:
+                self._stats["misses"] += 1
+                result = await loader()
+                if result is not None and result.status == 200:
+                    await self.put(url, ttl, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+            # Waiters get None rather than the owner's exception if the load blew up.
+            future.set_result(result)
+
+    async def put(self, url: str, ttl: Optional[float], response: UpstreamResponse):
+        if not self.enabled:
+            return
+        key = normalize_url(url)
+        entry = CachedResponse(content_hash(response.body), response.body, time.time() + (ttl or self.default_ttl),
+                               response.etag, response.last_modified)
+        self._put_memory(key, entry)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+        }
+
+    def _get_memory(self, key: str) -> Optional[CachedResponse]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.time():
+            self._memory.pop(key)
+            self._memory_size -= len(entry.body)
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    def _put_memory(self, key: str, entry: CachedResponse):
+        if len(entry.body) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous.body)
+        self._memory[key] = entry
+        self._memory_size += len(entry.body)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted.body)
+            self._stats["memory_evictions"] += 1
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, "index", hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.disk_dir, "blobs", digest)
+
+    def _read_disk(self, key: str) -> Optional[CachedResponse]:
+        index_path = self._index_path(key)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index["expires_at"] < time.time():
+                self._remove_disk(index_path)
+                return None
+            with open(self._blob_path(index["hash"]), "rb") as f:
+                return CachedResponse(index["hash"], f.read(), index["expires_at"], index.get("etag"), index.get("last_modified"))
+        except (FileNotFoundError, KeyError, ValueError):
+            # Nothing cached, a corrupt entry, or one whose blob was evicted: drop the index file if there is one.
+            self._remove_disk(index_path)
+            return None
+
+    def _write_disk(self, key: str, entry: CachedResponse):
+        os.makedirs(os.path.join(self.disk_dir, "index"), exist_ok=True)
+        os.makedirs(os.path.join(self.disk_dir, "blobs"), exist_ok=True)
+        blob_path = self._blob_path(entry.hash)
+        index_path = self._index_path(key)
+        with self._disk_lock:
+            total = self._disk_total()
+            # Blobs are content-addressed: identical bodies behind different URLs are written once.
+            if not os.path.exists(blob_path):
+                with open(blob_path + ".tmp", "wb") as f:
+                    f.write(entry.body)
+                os.replace(blob_path + ".tmp", blob_path)
+                total += len(entry.body)
+            else:
+                # Shared blobs count as recently used, so eviction by age doesn't drop one still being written.
+                os.utime(blob_path)
+            with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"url": key, "hash": entry.hash, "expires_at": entry.expires_at,
+                           "etag": entry.etag, "last_modified": entry.last_modified}, f)
+            total += os.path.getsize(index_path + ".tmp") - self._file_size(index_path)
+            os.replace(index_path + ".tmp", index_path)
+            self._disk_size = total
+            if total > self.disk_bytes:
+                self._evict_disk()
+
+    def _remove_disk(self, path: str):
+        with self._disk_lock:
+            size = self._file_size(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            if self._disk_size is not None and self._disk_size_dir == self.disk_dir:
+                self._disk_size -= size
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _disk_files(self):
+        for subdir in ("index", "blobs"):
+            path = os.path.join(self.disk_dir, subdir)
+            if os.path.isdir(path):
+                for entry in os.scandir(path):
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        yield entry
+
+    def _disk_total(self) -> int:
+        if self._disk_size is None or self._disk_size_dir != self.disk_dir:
+            self._disk_size = sum(entry.stat().st_size for entry in self._disk_files())
+            self._disk_size_dir = self.disk_dir
+        return self._disk_size
+
+    def _evict_disk(self):
+        # Runs only once the running total is over the limit, and frees down to 90% of it so the
+        # following writes don't each trigger another full scan.
+        files = [(entry.stat(), entry.path) for entry in self._disk_files()]
+        total = sum(stat.st_size for stat, _ in files)
+        target = self.disk_bytes * 0.9
+        # Oldest first, index files and blobs alike; index entries left pointing at an evicted blob are
+        # deleted when next read.
+        for stat, path in sorted(files, key=lambda file: file[0].st_mtime):
+            if total <= target:
+                break
+            os.remove(path)
+            total -= stat.st_size
+            self._stats["disk_evictions"] += 1
+        self._disk_size = total
+
+LOOKUP_RESULTS = ("memory_hits", "disk_hits", "coalesced", "misses")
+
+
+def _register_metrics(cache: ResponseCache):
+    def hit_ratio():
+        lookups = sum(cache._stats[result] for result in LOOKUP_RESULTS)
+        return [((), (lookups - cache._stats["misses"]) / lookups if lookups else None)]
+
+    metrics.Collected("response_cache_lookups_total", "Response cache lookups by result", "counter", ["result"],
+                      lambda: [((result,), cache._stats[result]) for result in LOOKUP_RESULTS])
+    metrics.Collected("response_cache_hit_ratio", "Share of response cache lookups answered without an upstream request",
+                      "gauge", [], hit_ratio)
+    metrics.Collected("response_cache_memory_bytes", "Bytes held by the in-memory response cache", "gauge", [],
+                      lambda: [((), cache._memory_size)])
+
+
+response_cache = ResponseCache()
+_register_metrics(response_cache)
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    def __init__(self, key: str):
+        self.key = key
+        self.events: List[Any] = []
+        self.done = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: Any):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self):
+        async with self._changed:
+            self.done = True
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        # Every subscriber replays the full history, so late joiners see the events they missed.
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: position < len(self.events) or self.done)
+                pending = self.events[position:]
+                finished = self.done
+            position += len(pending)
+            for event in pending:
+                yield event
+            if finished and position >= len(self.events):
+                return
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def join(self, key: str, producer: Callable[[], AsyncIterator[Any]]) -> Flight:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight(key)
+            self._flights[key] = flight
+            # The run is owned here, not by the first caller, so a disconnecting client can't cancel it for the others.
+            self._tasks[key] = asyncio.create_task(self._run(flight, producer))
+        else:
+            logger.info(f"Joining in-flight run for {key}")
+        return flight
+
+    async def _run(self, flight: Flight, producer: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for event in producer():
+                await flight.publish(event)
+        except Exception as e:
+            logger.error(f"In-flight run for {flight.key} failed: {str(e)}")
+            await flight.publish({"progress": 100, "status": "Error", "error": str(e)})
+        finally:
+            # Drop the key before the final notify so new callers after completion start from the DB, not this run.
+            self._flights.pop(flight.key, None)
+            self._tasks.pop(flight.key, None)
+            await flight.finish()
@@ -1,78 +1,178 @@
+import asyncio
+import json
 import logging
+import os
+from typing import Optional
 from app.services.country_service import CountryService
 from app.services.api_service import APIService
-from app.database.db import get_db
+from app.services.http_client import HostSemaphores
+from app.services.catalog_service import country_catalog
+from app.services.refresh_service import refresh_service
+from app.services.single_flight import SingleFlight
+from app.services import metrics, payload_codec
+from app.database.db import SessionLocal
 from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import IntegrityError
 from links import get_url
 
 logger = logging.getLogger(__name__)
 
+LINK_TYPES = ['sectors', 'sectors_information', 'projects_and_operations', 'indicator', 'indicator_meta_data', 'country_information', 'projects_and_operations_data', 'other_indecators_data', 'list_of_projects', 'country_indicator_meta_data']
+
 class CountryViewModel:
-    def __init__(self):
-        self.db = next(get_db())
+    def __init__(self, concurrent_fetch: bool = True, per_host_limit: Optional[int] = None):
         self.country_service = CountryService()
         self.api_service = APIService()
+        self.catalog = country_catalog
+        self.concurrent_fetch = concurrent_fetch
+        # The controller builds its view model at import time, so deployments set the limit through the environment.
+        self.host_limits = HostSemaphores(per_host_limit or int(os.getenv("UPSTREAM_PER_HOST_LIMIT", "8")))
+        self.ingestions = SingleFlight()
 
-    def get_country_data(self, country_code: str):
+    async def get_country_document(self, db, country_code: str, link_types=None, gzip: bool = False):
+        """
+        Render a stored country as a JSON document, inflating only the requested payloads.
+        :param country_code: The country code
+        :param link_types: Link types to include under "data"; all of them if None
+        :param gzip: Produce a gzip stream that passes the stored payloads through compressed
+        :return: An iterator over the response body, or None if the country is not stored
+        """
         logger.info(f"Attempting to fetch country data for code: {country_code}")
-        country = self.country_service.get_country(self.db, country_code)
-        return country.to_dict() if country else None
+        country = await self.country_service.get_country(db, country_code)
+        if not country:
+            return None
+        payloads = await self.country_service.get_payload_blobs(db, country.id, link_types)
+        return payload_codec.iter_document(self._document_parts(country, payloads), gzip)
+
+    @staticmethod
+    def _document_parts(country, payloads):
+        header = json.dumps(country.to_dict())
+        yield header[:-1] + ', "data": {'
+        for i, (link_type, blob) in enumerate(payloads):
+            yield f'{", " if i else ""}{json.dumps(link_type)}: '
+            yield blob
+        yield "}}"
+
+    async def get_country_payload(self, db, country_code: str, link_type: str, gzip: bool = False):
+        blob = await self.country_service.get_payload(db, country_code, link_type)
+        return payload_codec.iter_document([blob], gzip) if blob is not None else None
 
-    async def get_or_fetch_country_data(self, country_code: str):
-        existing_country = self.get_country_data(country_code)
+    async def get_indicator_series(self, db, indicator: str, country_code=None, start_year=None, end_year=None):
+        values = await self.country_service.get_indicator_series(db, indicator, country_code, start_year, end_year)
+        return [value.to_dict() for value in values]
+
+    async def get_or_fetch_country_data(self, db, country_code: str):
+        with metrics.stage("db.lookup"):
+            existing_country = await self.country_service.get_country(db, country_code)
         if existing_country:
             return {
                 "status": "Data retrieved from database",
-                "country": {"name": existing_country["name"], "code": existing_country["code"]}
+                "country": {"name": existing_country.name, "code": existing_country.code}
             }
 
         logger.info(f"Fetching data from API for country code: {country_code}")
-        all_countries = self.api_service.get_countries()
-        country = next((c for c in all_countries if country_code.lower() in [c[0].lower(), c[1].lower()]), None)
-        
+        with metrics.stage("catalog"):
+            country = await self.catalog.resolve(country_code)
+
         if not country:
             return {"error": "Country not found"}
 
         result = {"name": country[0], "code": country[1]}
+        flight = self.ingestions.join(country[1], lambda: self._ingest_country(country[0], country[1]))
         return {
             "country": result,
-            "progress_generator": self.fetch_country_data(country[0], country[1])
+            "progress_generator": flight.subscribe()
         }
 
+    async def _ingest_country(self, country_name, country_code):
+        # A run for this country may have finished between our DB check and joining.
+        async with SessionLocal() as db:
+            existing_country = await self.country_service.get_country(db, country_code)
+        if existing_country:
+            yield jsonable_encoder({"progress": 100, "status": "Data retrieved from database"})
+            return
+        async for progress in self.fetch_country_data(country_name, country_code):
+            yield progress
+
     async def fetch_country_data(self, country_name, country_code):
         country_data = {}
-        link_types = ['sectors', 'sectors_information', 'projects_and_operations', 'indicator', 'indicator_meta_data', 'country_information', 'projects_and_operations_data', 'other_indecators_data', 'list_of_projects', 'country_indicator_meta_data']
+        validators = {}
+        link_types = LINK_TYPES
         total_steps = len(link_types)
+        fetches = self._fetch_concurrently(link_types, country_code) if self.concurrent_fetch else self._fetch_sequentially(link_types, country_code)
 
-        for i, link_type in enumerate(link_types, 1):
-            try:
-                url = get_url(link_type, country_code)
-                data = await self.api_service.fetch_data(url, link_type)
-                if data[link_type] is not None:
-                    country_data[link_type] = data[link_type]
-                yield jsonable_encoder({"progress": i / total_steps * 100, "status": f"Fetched {link_type}"})
-            except Exception as e:
-                logger.error(f"Error fetching {link_type} data: {str(e)}")
+        i = 0
+        async for link_type, response, error in fetches:
+            i += 1
+            if error is not None:
+                logger.error(f"Error fetching {link_type} data: {str(error)}")
                 yield jsonable_encoder({"progress": i / total_steps * 100, "status": f"Error fetching {link_type}"})
+                continue
+            if response is not None:
+                country_data[link_type] = response.data
+                validators[link_type] = (response.etag, response.last_modified)
+            yield jsonable_encoder({"progress": i / total_steps * 100, "status": f"Fetched {link_type}"})
 
         if country_data:
-            self.save_country_data({
-                "name": country_name,
-                "code": country_code,
-                "data": country_data
-            })
+            # The flight outlives the request that started it, so it writes through its own session.
+            with metrics.stage("db.save"):
+                async with SessionLocal() as db:
+                    await self.save_country_data(db, {
+                        "name": country_name,
+                        "code": country_code,
+                        "data": country_data,
+                        "validators": validators
+                    })
             yield jsonable_encoder({"progress": 100, "status": "Data saved to database"})
         else:
             yield jsonable_encoder({"progress": 100, "status": "No data found"})
 
-    def save_country_data(self, country_data: dict):
-        existing_country = self.country_service.get_country(self.db, country_data['code'])
-        return (self.country_service.update_country(self.db, existing_country, country_data['data']) 
-                if existing_country else 
-                self.country_service.create_country(self.db, country_data))
+    async def _fetch_link(self, link_type: str, country_code: str):
+        try:
+            url = get_url(link_type, country_code)
+            with metrics.stage(f"fetch.{link_type}"):
+                async with self.host_limits.for_url(url):
+                    return link_type, await self.api_service.fetch_response(url, link_type), None
+        except Exception as e:
+            return link_type, None, e
+
+    async def _fetch_sequentially(self, link_types, country_code):
+        for link_type in link_types:
+            yield await self._fetch_link(link_type, country_code)
+
+    async def _fetch_concurrently(self, link_types, country_code):
+        tasks = [asyncio.create_task(self._fetch_link(link_type, country_code)) for link_type in link_types]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The client may disconnect mid-stream; don't leave orphaned requests behind.
+            for task in tasks:
+                task.cancel()
+
+    async def save_country_data(self, db, country_data: dict):
+        existing_country = await self.country_service.get_country(db, country_data['code'])
+        if existing_country is None:
+            try:
+                return await self.country_service.create_country(db, country_data)
+            except IntegrityError:
+                # Another worker or a direct POST stored the country between our check and the insert.
+                await db.rollback()
+                logger.info(f"Country {country_data['code']} was stored concurrently; updating it instead")
+                existing_country = await self.country_service.get_country(db, country_data['code'])
+        return await self.country_service.update_country(db, existing_country, country_data['data'], country_data.get('validators'))
+
+    async def refresh_country(self, db, country_code: str, force: bool = False):
+        if not await self.country_service.get_country(db, country_code):
+            return None
+        return await refresh_service.refresh(country_code, force=force)
+
+    async def delete_country(self, db, country_code: str):
+        return await self.country_service.delete_country(db, country_code)
 
-    def delete_country(self, country_code: str):
-        return self.country_service.delete_country(self.db, country_code)
+    async def get_country_catalog(self):
+        await self.catalog.get_countries()
+        return self.catalog
 
-    def get_all_countries(self):
-        return self.api_service.get_countries()
\ No newline at end of file
+    def get_upstream_stats(self):
+        return self.api_service.get_http_stats()
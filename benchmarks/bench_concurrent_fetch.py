@@ -0,0 +1,63 @@
+"""
+Cold-fetch latency of CountryViewModel.fetch_country_data, sequential vs concurrent.
+
+Runs against a local stub of the World Bank hosts so the numbers are reproducible:
+
+    python -m benchmarks.bench_concurrent_fetch --latency 0.2 --rounds 3
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.http_client import http_client
+from app.services.response_cache import response_cache
+from app.viewmodels.country_viewmodel import CountryViewModel, LINK_TYPES
+from benchmarks.stub_server import StubConfig, StubServer, link_latency, redirect_upstream
+
+
+async def cold_fetch(vm: CountryViewModel) -> float:
+    start = time.perf_counter()
+    async for _ in vm.fetch_country_data("Stubland", "STB"):
+        pass
+    return time.perf_counter() - start
+
+
+async def discard(db, country_data):
+    return None
+
+
+async def main(args):
+    stub = StubServer(StubConfig(latency=args.latency, payload_kb=args.payload_kb))
+    await stub.start()
+    redirect_upstream(stub)
+    # Measure fetch latency, not the upstream rate limiter or the response cache.
+    http_client.rate_per_host = None
+    response_cache.enabled = False
+    http_client.limit_per_host = args.per_host_limit
+
+    latencies = [link_latency(link_type, args.latency) for link_type in LINK_TYPES]
+    results = {"stub_sum_s": round(sum(latencies), 3), "stub_max_s": round(max(latencies), 3)}
+
+    try:
+        for mode, concurrent in (("sequential", False), ("concurrent", True)):
+            vm = CountryViewModel(concurrent_fetch=concurrent, per_host_limit=args.per_host_limit)
+            vm.save_country_data = discard
+            timings = [await cold_fetch(vm) for _ in range(args.rounds)]
+            results[f"{mode}_s"] = round(min(timings), 3)
+        results["upstream"] = http_client.stats()
+    finally:
+        await http_client.close()
+        await stub.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="base stub latency per request, in seconds")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--payload-kb", type=int, default=1, help="approximate size of each stub payload")
+    # Every stubbed host is 127.0.0.1, so the per-host limit applies to all ten link types at once.
+    parser.add_argument("--per-host-limit", type=int, default=len(LINK_TYPES))
+    asyncio.run(main(parser.parse_args()))
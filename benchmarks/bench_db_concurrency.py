@@ -0,0 +1,130 @@
+"""
+Mixed read/write load on the database: `/api/country/{code}` readers running in-process
+alongside a bulk ingestion writer, reporting read throughput and event-loop stalls.
+
+    python -m benchmarks.bench_db_concurrency --readers 32 --duration 10
+    python -m benchmarks.bench_db_concurrency --sync-writes   # the old blocking Session, for comparison
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.isolation import isolate
+
+isolate()
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.database.db import SQLALCHEMY_DATABASE_URL, create_tables, engine
+from app.models.payload import Payload
+from app.services import payload_codec
+from app.services.http_client import UpstreamResponse
+from app.services.ingestion_service import IngestionPipeline
+from app.viewmodels.country_viewmodel import LINK_TYPES
+from benchmarks.stats import percentile
+from benchmarks.stub_server import synthetic_payload
+from main import app
+
+
+def synthetic_batch(countries: int, size_kb: int, seed: int):
+    return [(f"Country {i}", f"C{i:03d}", link_type, UpstreamResponse(200, b"", synthetic_payload(link_type, f"C{i:03d}.{seed}", size_kb), None, None))
+            for i in range(countries) for link_type in LINK_TYPES]
+
+
+async def monitor_loop(stop: asyncio.Event, interval: float = 0.01):
+    # Oversleeping a short timer is time the loop spent blocked on something else.
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+    return lags
+
+
+async def reader(client: httpx.AsyncClient, codes, stop: asyncio.Event):
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(f"/api/country/{random.choice(codes)}")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def async_writer(pipeline: IngestionPipeline, args, stop: asyncio.Event):
+    batches = 0
+    while not stop.is_set():
+        batch = await asyncio.to_thread(synthetic_batch, args.write_countries, args.payload_kb, batches)
+        await pipeline._write_batch(batch)
+        batches += 1
+    return batches
+
+
+async def sync_writer(args, stop: asyncio.Event):
+    # What a blocking Session inside an async endpoint does: every write stalls the loop for its full duration.
+    sync_engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    batches = 0
+    try:
+        while not stop.is_set():
+            with Session(sync_engine) as db:
+                for name, code, link_type, response in synthetic_batch(args.write_countries, args.payload_kb, batches):
+                    text = json.dumps(response.data).encode()
+                    blob = payload_codec.encode(text)
+                    db.merge(Payload(hash=f"{code}-{link_type}-{batches}", data=blob, size=len(text), stored_size=len(blob)))
+                db.commit()
+            batches += 1
+            await asyncio.sleep(0)
+    finally:
+        sync_engine.dispose()
+    return batches
+
+
+async def main(args):
+    await create_tables()
+    pipeline = IngestionPipeline(batch_size=args.write_countries * len(LINK_TYPES))
+    await pipeline._write_batch(synthetic_batch(args.countries, args.payload_kb, -1))
+    codes = [f"C{i:03d}" for i in range(args.countries)]
+
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        monitor = asyncio.create_task(monitor_loop(stop))
+        writer = asyncio.create_task(sync_writer(args, stop) if args.sync_writes else async_writer(pipeline, args, stop))
+        readers = [asyncio.create_task(reader(client, codes, stop)) for _ in range(args.readers)]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        latencies = [latency for task in readers for latency in await task]
+        batches = await writer
+        lags = await monitor
+    await engine.dispose()
+
+    results = {
+        "database": engine.url.render_as_string(hide_password=True),
+        "writes": "sync" if args.sync_writes else "async",
+        "readers": args.readers,
+        "reads": len(latencies),
+        "reads_per_s": round(len(latencies) / args.duration, 1),
+        "read_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "read_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "write_batches": batches,
+        "payloads_written_per_s": round(batches * args.write_countries * len(LINK_TYPES) / args.duration, 1),
+        "loop_lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+        "loop_lag_max_ms": round(max(lags, default=0.0) * 1000, 2),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=32, help="concurrent /api/country clients")
+    parser.add_argument("--countries", type=int, default=20, help="countries seeded before the run")
+    parser.add_argument("--write-countries", type=int, default=5, help="countries per ingestion batch")
+    parser.add_argument("--payload-kb", type=int, default=64, help="approximate size of each synthetic payload")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of mixed load")
+    parser.add_argument("--sync-writes", action="store_true", help="write through a blocking Session instead of the async pipeline")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""
+Storage size, response latency and peak memory for a large country, comparing the previous
+JSON-text storage (payloads spliced into a string inside the response) with compressed
+payloads streamed as real JSON:
+
+    python -m benchmarks.bench_payload_storage --payload-kb 2048 --rounds 5
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.isolation import isolate
+
+isolate()
+
+import httpx
+from fastapi.responses import JSONResponse
+
+from app.database.db import SessionLocal, create_tables, engine
+from app.services import payload_codec
+from app.services.country_service import CountryService
+from app.viewmodels.country_viewmodel import CountryViewModel, LINK_TYPES
+from benchmarks.stub_server import synthetic_payload
+from main import app
+
+
+def legacy_response(country: dict, texts: dict) -> bytes:
+    # What GET /api/country/{code} returned before: the payloads spliced into a string, then re-encoded.
+    data = "{" + ", ".join(f'"{link_type}": {text}' for link_type, text in texts.items()) + "}"
+    return JSONResponse({**country, "data": data}).body
+
+
+async def measure(render, rounds: int):
+    async def call():
+        result = render()
+        if inspect.isawaitable(result):
+            await result
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    await call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_ms": round(statistics.median(timings) * 1000, 1), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+async def main(args):
+    await create_tables()
+    data = {link_type: synthetic_payload(link_type, "BIG", args.payload_kb) for link_type in LINK_TYPES}
+    texts = {link_type: json.dumps(payload) for link_type, payload in data.items()}
+    async with SessionLocal() as db:
+        country = await CountryService.create_country(db, {"name": "Bigland", "code": "BIG", "data": data})
+        storage = await CountryService.get_storage_stats(db)
+        blobs = await CountryService.get_payload_blobs(db, country.id)
+    header = country.to_dict()
+
+    def document(gzip: bool) -> bytes:
+        return b"".join(payload_codec.iter_document(CountryViewModel._document_parts(country, blobs), gzip))
+
+    results = {
+        "payloads": len(texts),
+        "json_bytes": sum(len(text) for text in texts.values()),
+        "stored_bytes": storage["stored_bytes"],
+        "compression_ratio": storage["compression_ratio"],
+        "render": {
+            "before": await measure(lambda: legacy_response(header, texts), args.rounds),
+            "after_identity": await measure(lambda: document(False), args.rounds),
+            "after_gzip": await measure(lambda: document(True), args.rounds),
+        },
+        "client_decode": {
+            "before": await measure(lambda: json.loads(json.loads(legacy_response(header, texts))["data"]), args.rounds),
+            "after": await measure(lambda: json.loads(document(False)), args.rounds),
+        },
+    }
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def get(path, encoding):
+            response = await client.get(path, headers={"Accept-Encoding": encoding})
+            response.raise_for_status()
+            return response.content
+
+        results["endpoint"] = {
+            "identity": await measure(lambda: get("/api/country/BIG", "identity"), args.rounds),
+            "gzip": await measure(lambda: get("/api/country/BIG", "gzip"), args.rounds),
+            "one_link_type": await measure(lambda: get(f"/api/country/BIG?link_types={LINK_TYPES[0]}", "identity"), args.rounds),
+        }
+    await engine.dispose()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload-kb", type=int, default=1024, help="approximate JSON size of each of the ten payloads")
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+"""
+N parallel clients requesting the same uncached country through CountryViewModel.
+
+With request coalescing there should be exactly one set of upstream calls and one DB write,
+and every client (including late joiners) should see the full progress stream. A second
+phase races several writers for another country the way two workers would, past the in-process
+coalescing, and checks the unique constraint on Country.code never surfaces as an error:
+
+    python -m benchmarks.bench_single_flight --clients 50
+
+Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from benchmarks.isolation import isolate
+
+isolate()
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.database.db import SessionLocal, create_tables, engine
+from app.models.country import Country
+from app.services.country_service import CountryService
+from app.services.http_client import http_client
+from app.services.response_cache import response_cache
+from app.viewmodels.country_viewmodel import CountryViewModel, LINK_TYPES
+from benchmarks.stub_server import StubConfig, StubServer, redirect_upstream
+
+
+async def client(vm: CountryViewModel, join_delay: float):
+    await asyncio.sleep(join_delay)
+    # One session per client, as get_db gives each request.
+    async with SessionLocal() as db:
+        result = await vm.get_or_fetch_country_data(db, "STB")
+    return [event async for event in result["progress_generator"]]
+
+
+def counting(method, calls: Counter, name: str):
+    # Counts calls but still runs the real CountryService method against the database.
+    async def wrapper(*args, **kwargs):
+        calls[name] += 1
+        return await method(*args, **kwargs)
+    return wrapper
+
+
+async def count_rows(code: str) -> int:
+    async with SessionLocal() as db:
+        return (await db.execute(select(func.count(Country.id)).where(Country.code == code))).scalar()
+
+
+async def racing_writer(vm: CountryViewModel, code: str, start: asyncio.Event):
+    await start.wait()
+    async with SessionLocal() as db:
+        await vm.save_country_data(db, {"name": "Racing", "code": code, "data": {"sectors": {"writer": random.random()}}})
+
+
+async def main(args):
+    await create_tables()
+    stub = StubServer(StubConfig(latency=args.latency, payload_kb=args.payload_kb))
+    await stub.start()
+    redirect_upstream(stub)
+    http_client.rate_per_host = None
+    response_cache.enabled = False
+
+    vm = CountryViewModel()
+    vm.catalog._set([("Stubland", "STB")], time.time())
+    writes = Counter()
+    vm.country_service.create_country = counting(CountryService.create_country, writes, "create")
+    vm.country_service.update_country = counting(CountryService.update_country, writes, "update")
+
+    try:
+        start = time.perf_counter()
+        # Spread joins across the run so some clients subscribe after progress has already been emitted.
+        streams = await asyncio.gather(*(client(vm, random.uniform(0, args.latency)) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - start
+        stb_rows = await count_rows("STB")
+        coalesced_writes = sum(writes.values())
+
+        writes.clear()
+        go = asyncio.Event()
+        racers = [asyncio.create_task(racing_writer(vm, "RCE", go)) for _ in range(args.racers)]
+        go.set()
+        race_results = await asyncio.gather(*racers, return_exceptions=True)
+        race_rows = await count_rows("RCE")
+    finally:
+        await http_client.close()
+        await stub.stop()
+        await engine.dispose()
+
+    errors = [result for result in race_results if isinstance(result, Exception)]
+    results = {
+        "clients": args.clients,
+        "elapsed_s": round(elapsed, 3),
+        "upstream_calls": sum(stub.calls.values()),
+        "expected_upstream_calls": len(LINK_TYPES),
+        "db_writes": coalesced_writes,
+        "country_rows": stb_rows,
+        "complete_streams": sum(len(stream) == len(LINK_TYPES) + 1 for stream in streams),
+        "race": {
+            "writers": args.racers,
+            "create_attempts": writes["create"],
+            "updates": writes["update"],
+            "country_rows": race_rows,
+            "integrity_errors": sum(isinstance(error, IntegrityError) for error in errors),
+            "other_errors": [repr(error) for error in errors if not isinstance(error, IntegrityError)],
+        },
+    }
+    print(json.dumps(results, indent=2))
+    if results["upstream_calls"] != len(LINK_TYPES) or coalesced_writes != 1 or stb_rows != 1:
+        raise SystemExit("request coalescing failed: duplicate upstream calls or DB writes")
+    if errors or race_rows != 1:
+        raise SystemExit("concurrent writers for one country failed or stored it twice")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--racers", type=int, default=4, help="writers racing to store the same new country")
+    parser.add_argument("--latency", type=float, default=0.2, help="base stub latency per request, in seconds")
+    parser.add_argument("--payload-kb", type=int, default=16, help="approximate size of each stub payload")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+
+def isolate():
+    """
+    Point the app at a throwaway SQLite file and keep the background refresh scheduler off.
+
+    Must run before anything from app/ or main is imported, since both settings are read at import time.
+    DATABASE_URL is deliberately ignored: a developer may have it exported for the app itself, and the
+    benchmarks write fake countries and reset ingestion checkpoints. Set BENCH_DATABASE_URL to benchmark
+    another database.
+    """
+    os.environ["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    # The scheduler would revalidate stored payloads against the stub and overwrite them with synthetic bodies.
+    os.environ["REFRESH_SCHEDULER_ENABLED"] = "0"
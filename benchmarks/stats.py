@@ -0,0 +1,12 @@
+import statistics
+
+
+def percentile(values, q):
+    # Inclusive quantiles stay within the observed range, so p99 of a small sample never exceeds its max.
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def spread(values):
+    return max(values) - min(values) if values else 0.0
@@ -0,0 +1,229 @@
+"""
+Local stand-in for data.worldbank.org and search.worldbank.org.
+
+Every LINK_TEMPLATES entry and the country catalog are answered from recordings in
+benchmarks/recordings/<link_type>.json when present, otherwise from synthetic payloads
+shaped like the real responses. Latency, 429 injection and payload size are configurable.
+
+Record real payloads once (needs network access):
+
+    python -m benchmarks.stub_server record --country IND
+
+Serve the stub on its own, e.g. for manual testing:
+
+    python -m benchmarks.stub_server serve --port 8765 --latency 0.1 --rate-limit-every 20
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from app.services.api_service import COUNTRIES_URL
+from links import LINK_TEMPLATES, get_url
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+CATALOG_LINK_TYPE = "countries"
+PLACEHOLDER = "@COUNTRY@"
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.05  # base seconds per response; each link type gets 0.5x-1.5x of it
+    payload_kb: int = 64  # approximate size of synthetic payloads (recordings are replayed as-is)
+    rate_limit_every: int = 0  # answer every Nth request with a 429; 0 disables
+    retry_after: float = 0.05
+    countries: int = 50
+    recordings_dir: Optional[str] = RECORDINGS_DIR
+
+
+def link_latency(link_type: str, base_latency: float) -> float:
+    # Spread latencies between 0.5x and 1.5x of the base so that "slowest request" != "average request".
+    spread = int(hashlib.sha1(link_type.encode()).hexdigest()[:4], 16) / 0xFFFF
+    return base_latency * (0.5 + spread)
+
+
+def country_codes(count: int):
+    return [f"S{i:03d}" for i in range(count)]
+
+
+def catalog_payload(count: int) -> dict:
+    countries = [{"id": code, "name": f"Stubland {code}", "locationType": "country"} for code in country_codes(count)]
+    # Aggregates appear in the real catalog too and have to be filtered out.
+    countries.append({"id": "WLD", "name": "World", "locationType": "aggregate"})
+    return {"jsonGraph": {"lists": {"countries": {"en": {"$type": "atom", "value": countries}}}}}
+
+
+def synthetic_payload(link_type: str, code: str, size_kb: int) -> dict:
+    rng = random.Random(f"{link_type}:{code}")
+    if link_type in ("sectors", "list_of_projects"):
+        projects, size = {}, 0
+        while size < size_kb * 1024:
+            project_id = f"P{rng.randrange(10 ** 6):06d}"
+            projects[project_id] = {"id": project_id, "project_name": f"Project {project_id}", "countrycode": [code],
+                                    "status": rng.choice(["Active", "Closed"]), "totalcommamt": str(rng.randrange(10 ** 9))}
+            size += 160
+        return {"rows": len(projects), "total": len(projects), "projects": projects}
+    if link_type == "indicator":
+        series, size = {}, 0
+        while size < size_kb * 1024:
+            indicator = f"IND.{rng.randrange(10 ** 6):06d}"
+            series[indicator] = {str(year): {"$type": "atom", "value": round(rng.uniform(0, 100), 3)} for year in range(2000, 2024)}
+            size += 24 * 40
+        return {"jsonGraph": {"indicatorData": {code: {"$type": "atom", "value": series}}}}
+    entries, size = {}, 0
+    while size < size_kb * 1024:
+        key = f"K{rng.randrange(10 ** 6):06d}"
+        entries[key] = {"$type": "atom", "value": {"name": f"Entry {key}", "description": "x" * rng.randrange(40, 120)}}
+        size += 140
+    return {"jsonGraph": {link_type: {code: entries}}}
+
+
+class StubServer:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.calls = Counter()
+        self.rate_limited = 0
+        self._requests = 0
+        self._recordings: Dict[str, bytes] = {}
+        self._templates: Dict[str, bytes] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+        if config.recordings_dir and os.path.isdir(config.recordings_dir):
+            for link_type in list(LINK_TEMPLATES) + [CATALOG_LINK_TYPE]:
+                path = os.path.join(config.recordings_dir, f"{link_type}.json")
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        self._recordings[link_type] = f.read()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.base_url = f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def url_for(self, url: str, link_type: str, code: str = "") -> str:
+        # Keeps the real host and path in the stub URL so logs and recordings stay recognisable.
+        parts = urlsplit(url)
+        return f"{self.base_url}/{parts.netloc}{parts.path}?{parts.query}&_link_type={link_type}&_code={code}"
+
+    async def _handle(self, request: web.Request):
+        link_type = request.query.get("_link_type", "")
+        code = request.query.get("_code", "")
+        self.calls[link_type] += 1
+        self._requests += 1
+        # Taken before sleeping: concurrent requests bump the counter while this one waits.
+        n = self._requests
+        await asyncio.sleep(link_latency(link_type, self.config.latency))
+        if self.config.rate_limit_every and n % self.config.rate_limit_every == 0:
+            self.rate_limited += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.config.retry_after)})
+        body = self._body(link_type, code)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    def _body(self, link_type: str, code: str) -> bytes:
+        # Bodies are built once per link type and stamped with the country, keeping the stub's own CPU
+        # and memory out of the measurements while payloads still differ per country like the real ones.
+        if link_type not in self._templates:
+            if link_type == CATALOG_LINK_TYPE:
+                body = self._recordings.get(link_type) or json.dumps(catalog_payload(self.config.countries)).encode()
+            elif link_type in self._recordings:
+                body = self._recordings[link_type].rstrip()[:-1] + f', "_stub_country": "{PLACEHOLDER}"}}'.encode()
+            else:
+                body = json.dumps(synthetic_payload(link_type, PLACEHOLDER, self.config.payload_kb)).encode()
+            self._templates[link_type] = body
+        return self._templates[link_type].replace(PLACEHOLDER.encode(), code.encode())
+
+
+def country_of(url: str, link_type: str) -> str:
+    # Recover the country code by lining the URL up against its template.
+    prefix, marker, suffix = LINK_TEMPLATES.get(link_type, "").partition("{sort_name}")
+    if marker and url.startswith(prefix) and url.endswith(suffix):
+        return url[len(prefix):len(url) - len(suffix)]
+    return ""
+
+
+def redirect_upstream(stub: StubServer):
+    """
+    Point the app's upstream HTTP client at the stub. Every caller (viewmodel, catalog,
+    ingestion, refresh) goes through HTTPClient.get_response, so this is the only patch needed.
+    Cache keys, refresh validators and ingestion checkpoints still see the real URLs.
+    """
+    from app.services.http_client import http_client
+
+    get_response = http_client.get_response
+
+    async def stubbed(url, data_type, headers=None):
+        link_type = CATALOG_LINK_TYPE if url == COUNTRIES_URL else data_type
+        return await get_response(stub.url_for(url, link_type, country_of(url, link_type)), data_type, headers)
+
+    http_client.get_response = stubbed
+    return http_client
+
+
+async def record(country: str, out_dir: str):
+    from app.services.http_client import http_client
+
+    os.makedirs(out_dir, exist_ok=True)
+    await http_client.start()
+    try:
+        targets = {link_type: get_url(link_type, country) for link_type in LINK_TEMPLATES}
+        targets[CATALOG_LINK_TYPE] = COUNTRIES_URL
+        for link_type, url in targets.items():
+            response = await http_client.get_response(url, link_type)
+            if response is None:
+                print(f"failed: {link_type}")
+                continue
+            with open(os.path.join(out_dir, f"{link_type}.json"), "wb") as f:
+                f.write(response.body)
+            print(f"recorded {link_type}: {len(response.body)} bytes")
+    finally:
+        await http_client.close()
+
+
+async def serve(config: StubConfig, port: int):
+    stub = StubServer(config)
+    print(f"stub listening on {await stub.start(port=port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="save live responses for one country as recordings")
+    record_parser.add_argument("--country", default="IND")
+    record_parser.add_argument("--out", default=RECORDINGS_DIR)
+    serve_parser = commands.add_parser("serve", help="run the stub until interrupted")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--latency", type=float, default=StubConfig.latency)
+    serve_parser.add_argument("--payload-kb", type=int, default=StubConfig.payload_kb)
+    serve_parser.add_argument("--rate-limit-every", type=int, default=0)
+    serve_parser.add_argument("--countries", type=int, default=StubConfig.countries)
+    args = parser.parse_args()
+    if args.command == "record":
+        asyncio.run(record(args.country, args.out))
+    else:
+        asyncio.run(serve(StubConfig(latency=args.latency, payload_kb=args.payload_kb,
+                                     rate_limit_every=args.rate_limit_every, countries=args.countries), args.port))
@@ -0,0 +1,260 @@
+"""
+Offline benchmark suite: drives the app in-process against the local World Bank stub and
+compares each scenario with a stored baseline.
+
+    python -m benchmarks.suite                      # run, compare with benchmarks/baseline.json
+    python -m benchmarks.suite --update-baseline    # run and store the results as the new baseline
+    python -m benchmarks.suite --only cold_single --only warm_reads --latency 0.2
+
+Exits with status 1 when a scenario's p95 latency or peak RSS grows, or its throughput drops,
+by more than both --tolerance and --noise times the spread between repeats. The baseline is
+local to the machine that wrote it (it is not committed); status 2 means it is missing or was
+recorded on another machine or with other settings. Runs against a throwaway response cache
+directory and SQLite file (set BENCH_DATABASE_URL to use another database; DATABASE_URL is
+ignored).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.isolation import isolate
+
+isolate()
+
+import httpx
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from app.services.http_client import http_client
+from app.services.ingestion_service import IngestionPipeline
+from app.services.response_cache import response_cache
+from benchmarks.stats import percentile, spread
+from benchmarks.stub_server import StubConfig, StubServer, country_codes, redirect_upstream
+from links import LINK_TEMPLATES
+from main import app, lifespan
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+SCENARIOS = ("cold_single", "warm_reads", "concurrent_same", "concurrent_different", "countries_listing", "full_ingest")
+
+
+def rss_bytes() -> int:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Only the process-wide high-water mark is available, so later scenarios inherit earlier peaks.
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+async def sample_rss(stop: asyncio.Event, interval: float = 0.01) -> int:
+    peak = rss_bytes()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        peak = max(peak, rss_bytes())
+    return peak
+
+
+class Countries:
+    """Hands out catalog countries no earlier scenario has touched, so "cold" really is cold."""
+
+    def __init__(self, codes):
+        self._codes = iter(codes)
+
+    def take(self, count: int):
+        codes = [next(self._codes, None) for _ in range(count)]
+        if None in codes:
+            raise SystemExit("Stub catalog too small for these settings; raise --countries")
+        return codes
+
+
+async def timed(request):
+    start = time.perf_counter()
+    response = await request()
+    response.raise_for_status()
+    if b'"error"' in response.content[-200:]:
+        raise RuntimeError(f"Request failed: {response.content[-200:]!r}")
+    return time.perf_counter() - start
+
+
+async def cold_single(client, countries, args):
+    return [await timed(lambda: client.get(f"/selected-country/{code}")) for code in countries.take(args.rounds)]
+
+
+async def warm_reads(client, countries, args):
+    codes = countries.take(args.clients)
+    await asyncio.gather(*(timed(lambda code=code: client.get(f"/selected-country/{code}")) for code in codes))
+    return [await timed(lambda: client.get(f"/api/country/{codes[i % len(codes)]}")) for i in range(args.requests)]
+
+
+async def concurrent_same(client, countries, args):
+    latencies = []
+    for code in countries.take(args.rounds):
+        latencies += await asyncio.gather(*(timed(lambda: client.get(f"/selected-country/{code}")) for _ in range(args.clients)))
+    return latencies
+
+
+async def concurrent_different(client, countries, args):
+    latencies = []
+    for _ in range(args.rounds):
+        codes = countries.take(args.clients)
+        latencies += await asyncio.gather(*(timed(lambda code=code: client.get(f"/selected-country/{code}")) for code in codes))
+    return latencies
+
+
+async def countries_listing(client, countries, args):
+    return [await timed(lambda: client.get("/countries/")) for _ in range(args.requests)]
+
+
+async def full_ingest(client, countries, args):
+    codes = countries.take(args.ingest_countries)
+    stats = await IngestionPipeline().run([(f"Stubland {code}", code) for code in codes], restart=True)
+    if stats["payloads_failed"]:
+        raise RuntimeError(f"Ingestion failed for {stats['payloads_failed']} payloads")
+    # One sample for the whole run; throughput below is payloads written per second.
+    return [stats["elapsed_s"]], stats["payloads_written"]
+
+
+async def run_scenario(name, stub: StubServer, client, countries, args):
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(stop))
+    calls_before, rate_limited_before = sum(stub.calls.values()), stub.rate_limited
+    start = time.perf_counter()
+    result = await globals()[name](client, countries, args)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    peak = await sampler
+    latencies, operations = result if isinstance(result, tuple) else (result, len(result))
+    return {
+        "operations": operations,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_per_s": round(operations / elapsed, 2) if elapsed else 0.0,
+        "upstream_calls": sum(stub.calls.values()) - calls_before,
+        "upstream_429s": stub.rate_limited - rate_limited_before,
+        "peak_rss_mb": round(peak / 2 ** 20, 1),
+    }
+
+
+def exceeds(change: float, before: float, spread: float, tolerance: float, noise: float, floor: float = 0.0) -> bool:
+    # A change only counts when it is larger than the relative tolerance and than the noise seen between repeats.
+    return change > max(before * tolerance, spread * noise, floor)
+
+
+def compare(results, spreads, baseline, tolerance: float, noise: float, min_delta_ms: float):
+    regressions = []
+    for name, result in results.items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        spread = {metric: spreads[name][metric] + baseline["spreads"][name][metric] for metric in spreads[name]}
+        if exceeds(result["p95_ms"] - before["p95_ms"], before["p95_ms"], spread["p95_ms"], tolerance, noise, min_delta_ms):
+            regressions.append(f"{name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+        if exceeds(before["throughput_per_s"] - result["throughput_per_s"], before["throughput_per_s"], spread["throughput_per_s"], tolerance, noise):
+            regressions.append(f"{name}: throughput {before['throughput_per_s']}/s -> {result['throughput_per_s']}/s")
+        if exceeds(result["peak_rss_mb"] - before["peak_rss_mb"], before["peak_rss_mb"], spread["peak_rss_mb"], tolerance, noise):
+            regressions.append(f"{name}: peak RSS {before['peak_rss_mb']} MB -> {result['peak_rss_mb']} MB")
+    return regressions
+
+
+def settings(args):
+    # Only runs with the same workload are comparable; the baseline records it.
+    return {name: getattr(args, name) for name in ("latency", "payload_kb", "rate_limit_every", "rounds", "clients",
+                                                    "requests", "ingest_countries", "upstream_rate", "backoff_base", "repeat")}
+
+
+def machine():
+    # Timings from another machine or interpreter say nothing about this change.
+    return {"platform": platform.platform(), "arch": platform.machine(), "cpus": os.cpu_count(),
+            "python": platform.python_version()}
+
+
+async def main(args):
+    scenarios = args.only or list(SCENARIOS)
+    needed = args.repeat * (args.rounds * (2 + args.clients) + args.clients + args.ingest_countries)
+    stub = StubServer(StubConfig(latency=args.latency, payload_kb=args.payload_kb,
+                                 rate_limit_every=args.rate_limit_every, countries=needed))
+    await stub.start()
+    redirect_upstream(stub)
+    http_client.rate_per_host = args.upstream_rate
+    http_client.backoff_base = args.backoff_base
+    response_cache.disk_dir = tempfile.mkdtemp()
+
+    results, spreads = {}, {}
+    try:
+        async with lifespan(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+                await timed(lambda: client.get("/countries/"))
+                countries = Countries(country_codes(needed))
+                for name in scenarios:
+                    runs = [await run_scenario(name, stub, client, countries, args) for _ in range(args.repeat)]
+                    # Median of each metric across repeats, so one noisy run doesn't decide the comparison.
+                    results[name] = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+                    spreads[name] = {metric: spread([run[metric] for run in runs]) for metric in runs[0]}
+                    print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+    finally:
+        await stub.stop()
+
+    report = {"settings": settings(args), "machine": machine(), "rss_source": "psutil" if psutil else "procfs", "scenarios": results,
+              "upstream": {"calls": dict(stub.calls), "rate_limited": stub.rate_limited}}
+    print(json.dumps(report, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": report["settings"], "machine": report["machine"], "scenarios": results, "spreads": spreads}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one", file=sys.stderr)
+        return 0 if args.allow_missing_baseline else 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != report["settings"]:
+        print(f"Baseline was recorded with different settings {baseline['settings']}; not comparing", file=sys.stderr)
+        return 2
+    if baseline.get("machine") != report["machine"]:
+        print(f"Baseline was recorded on another machine {baseline.get('machine')}; run with --update-baseline here", file=sys.stderr)
+        return 2
+    regressions = compare(results, spreads, baseline, args.tolerance, args.noise, args.min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=SCENARIOS, help="run only this scenario (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.05, help="base stub response time in seconds")
+    parser.add_argument("--payload-kb", type=int, default=64, help="approximate size of each synthetic payload")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="stub answers every Nth request with a 429")
+    parser.add_argument("--rounds", type=int, default=5, help="cold fetches, and rounds of the concurrent scenarios")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients per round")
+    parser.add_argument("--requests", type=int, default=200, help="requests in the warm read and listing scenarios")
+    parser.add_argument("--ingest-countries", type=int, default=20, help=f"countries in the full ingest ({len(LINK_TEMPLATES)} payloads each)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the report takes the median of each metric")
+    parser.add_argument("--upstream-rate", type=float, default=None, help="per-host request rate limit; off by default")
+    parser.add_argument("--backoff-base", type=float, default=0.01, help="retry backoff base in seconds")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--allow-missing-baseline", action="store_true", help="exit 0 instead of 2 when there is no baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before a scenario counts as regressed")
+    parser.add_argument("--noise", type=float, default=1.0,
+                        help="allowed change in multiples of the run-to-run spread (max - min over the repeats of both runs)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore p95 increases smaller than this")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,59 @@
+"""
+Bulk ingestion of World Bank data for all (or selected) countries.
+
+    python ingest.py                          # every country in the catalog
+    python ingest.py --countries IND BRA      # by code or name
+    python ingest.py --restart                # ignore checkpoints from a previous run
+
+Progress is checkpointed per (country, link_type), so re-running after an interruption resumes where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from app.database.db import SessionLocal, create_tables, engine
+from app.services.country_service import CountryService
+from app.services.catalog_service import country_catalog
+from app.services.http_client import http_client
+from app.services.ingestion_service import IngestionPipeline
+from links import LINK_TEMPLATES
+
+
+async def run(args):
+    await create_tables()
+    async with SessionLocal() as db:
+        await CountryService.migrate_legacy_data(db)
+    await http_client.start()
+    try:
+        await country_catalog.start()
+        pipeline = IngestionPipeline(
+            concurrency=args.concurrency,
+            per_host_limit=args.per_host_limit,
+            batch_size=args.batch_size,
+            link_types=args.link_types,
+        )
+        countries = await pipeline.select_countries(args.countries)
+        return await pipeline.run(countries, restart=args.restart)
+    finally:
+        await http_client.close()
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--countries", nargs="*", help="country codes or names (default: all countries)")
+    parser.add_argument("--link-types", nargs="*", choices=list(LINK_TEMPLATES), help="link types to fetch (default: all)")
+    parser.add_argument("--concurrency", type=int, default=16, help="maximum upstream requests in flight")
+    parser.add_argument("--per-host-limit", type=int, default=8, help="maximum upstream requests in flight per host")
+    parser.add_argument("--batch-size", type=int, default=50, help="payloads per DB transaction")
+    parser.add_argument("--restart", action="store_true", help="clear checkpoints and ingest everything again")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
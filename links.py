@@ -15,6 +15,23 @@ LINK_TEMPLATES = {
 
 
 }
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# How long an upstream response stays fresh, per link type: both in the response cache and in the DB before a refresh revalidates it.
+LINK_TTLS = {
+    'sectors': 6 * HOUR,
+    'sectors_information': 7 * DAY,
+    'projects_and_operations': DAY,
+    'indicator': DAY,
+    'indicator_meta_data': 7 * DAY,
+    'country_information': 7 * DAY,
+    'projects_and_operations_data': DAY,
+    'other_indecators_data': DAY,
+    'list_of_projects': 6 * HOUR,
+    'country_indicator_meta_data': 7 * DAY,
+}
+
 def get_url(link_type: str, sort_name: str) -> str:
     """
     Generate a URL based on the link type and sort name.
@@ -1,13 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from app.controllers.country_controller import router as country_router
-from app.database.db import engine, Base
+from app.database.db import SessionLocal, engine, create_tables
+from app.services.country_service import CountryService
+from app.services.http_client import http_client
+from app.services.metrics import ProfilingMiddleware
+from app.services.catalog_service import country_catalog
+from app.services.refresh_service import refresh_scheduler
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_tables()
+    async with SessionLocal() as db:
+        await CountryService.migrate_legacy_data(db)
+    await http_client.start()
+    await country_catalog.start()
+    refresh_scheduler.start()
+    yield
+    await refresh_scheduler.stop()
+    await http_client.close()
+    await engine.dispose()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database.db import Base
+from app.models.country import Country
+from app.models.country_payload import CountryPayload
+from app.models.indicator_value import IndicatorValue
+from app.models.payload import Payload
+from app.services.country_service import CountryService
+from app.viewmodels.country_viewmodel import CountryViewModel
+
+
+def indicator_payload(code, values):
+    return {"jsonGraph": {"indicatorData": {code: {"$type": "atom", "value": {"NY.GDP": values}}}}}
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    yield async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+async def link_types(db, code):
+    return set((await db.execute(
+        select(CountryPayload.link_type).join(Country).where(Country.code == code)
+    )).scalars())
+
+
+async def count(db, model, *where):
+    return (await db.execute(select(func.count()).select_from(model).where(*where))).scalar()
+
+
+def test_post_replaces_data_and_clears_indicator_rows_when_indicator_is_absent(sessions):
+    async def scenario():
+        vm = CountryViewModel()
+        async with sessions() as db:
+            await vm.save_country_data(db, {"name": "India", "code": "IND", "data": {
+                "sectors": {"a": 1}, "indicator": indicator_payload("IND", {"2019": 1.5, "2020": 2})}})
+            assert await count(db, IndicatorValue, IndicatorValue.country_code == "IND") == 2
+
+        async with sessions() as db:
+            await vm.save_country_data(db, {"name": "India", "code": "IND", "data": {"country_information": {"b": 2}}})
+
+        async with sessions() as db:
+            assert await link_types(db, "IND") == {"country_information"}
+            assert await count(db, IndicatorValue, IndicatorValue.country_code == "IND") == 0
+            # Payloads no country refers to any more are pruned.
+            assert await count(db, Payload) == 1
+            assert await count(db, Country) == 1
+
+    asyncio.run(scenario())
+
+
+def test_post_with_indicator_rewrites_indicator_rows(sessions):
+    async def scenario():
+        vm = CountryViewModel()
+        async with sessions() as db:
+            await vm.save_country_data(db, {"name": "India", "code": "IND", "data": {"indicator": indicator_payload("IND", {"2019": 1})}})
+        async with sessions() as db:
+            await vm.save_country_data(db, {"name": "India", "code": "IND", "data": {"indicator": indicator_payload("IND", {"2021": 3})}})
+        async with sessions() as db:
+            series = await CountryService.get_indicator_series(db, "NY.GDP", "IND")
+            assert [(row.year, row.value) for row in series] == [(2021, 3.0)]
+
+    asyncio.run(scenario())
+
+
+def test_migrate_legacy_data(sessions):
+    legacy = {"sectors": {"a": 1}, "indicator": indicator_payload("IND", {"2019": 1.5})}
+
+    async def scenario():
+        async with sessions() as db:
+            # The column earlier versions stored each country's JSON in.
+            await db.execute(text("ALTER TABLE countries ADD COLUMN data TEXT"))
+            await db.execute(text("INSERT INTO countries (name, code, data) VALUES (:name, :code, :data)"), [
+                {"name": "India", "code": "IND", "data": json.dumps(legacy)},
+                {"name": "Broken", "code": "BAD", "data": "{not json"},
+                {"name": "Empty", "code": "EMP", "data": "{}"},
+                {"name": "Fresh", "code": "NEW", "data": None},
+            ])
+            await db.commit()
+
+        async with sessions() as db:
+            assert await CountryService.migrate_legacy_data(db, batch_size=2) == 1
+
+        async with sessions() as db:
+            assert await link_types(db, "IND") == {"sectors", "indicator"}
+            assert await count(db, IndicatorValue, IndicatorValue.country_code == "IND") == 1
+            remaining = dict((await db.execute(text("SELECT code, data FROM countries WHERE data IS NOT NULL"))).all())
+            # Unreadable data is left in place for a later look rather than discarded.
+            assert remaining == {"BAD": "{not json"}
+            assert await link_types(db, "BAD") == set()
+            # Running again only revisits the unreadable row.
+            assert await CountryService.migrate_legacy_data(db) == 0
+
+    asyncio.run(scenario())
+
+
+def test_migrate_legacy_data_without_the_legacy_column(sessions):
+    async def scenario():
+        async with sessions() as db:
+            assert await CountryService.migrate_legacy_data(db) == 0
+
+    asyncio.run(scenario())
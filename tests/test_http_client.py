@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from app.services.http_client import HTTPClient
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("5", 5.0),
+    ("0.5", 0.5),
+    ("-3", 0.0),
+    ("soon", None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert HTTPClient._parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= HTTPClient._parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+    past = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert HTTPClient._parse_retry_after(format_datetime(past, usegmt=True)) == 0.0
+
+
+def test_parse_retry_after_date_without_zone_is_utc():
+    retry_at = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=30)
+    assert 25 <= HTTPClient._parse_retry_after(retry_at.strftime("%a, %d %b %Y %H:%M:%S")) <= 30
+
+
+@pytest.mark.parametrize("attempt", range(8))
+def test_backoff_is_full_jitter_capped(attempt):
+    client = HTTPClient(backoff_base=0.5, backoff_cap=4.0)
+    delays = [client._backoff(attempt, None) for _ in range(200)]
+    assert all(0 <= delay <= min(4.0, 0.5 * 2 ** attempt) for delay in delays)
+    # Jittered, not a fixed schedule.
+    assert len(set(delays)) > 1
+
+
+def test_backoff_adds_retry_after_up_to_the_cap():
+    client = HTTPClient(backoff_base=0.5, backoff_cap=4.0)
+    assert all(2.0 <= client._backoff(0, 2.0) <= 2.5 for _ in range(100))
+    assert all(4.0 <= client._backoff(0, 60.0) <= 4.5 for _ in range(100))
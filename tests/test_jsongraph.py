@@ -0,0 +1,51 @@
+from app.services.country_service import CountryService
+from app.services.jsongraph import flatten_indicator_data
+
+
+def atom(value):
+    return {"$type": "atom", "value": value}
+
+
+def indicator_payload(series_by_country):
+    return {"jsonGraph": {"indicatorData": series_by_country}}
+
+
+def test_atom_wrapped_year_keyed_series():
+    payload = indicator_payload({"IND": atom({"NY.GDP": {"2019": atom(1.5), "2020": atom(2)}})})
+    assert list(flatten_indicator_data(payload)) == [("IND", "NY.GDP", 2019, 1.5), ("IND", "NY.GDP", 2020, 2.0)]
+
+
+def test_unwrapped_series_and_atom_wrapped_series_node():
+    payload = indicator_payload({"BRA": {"SP.POP": atom({"2000": 10, "2001": atom(11.5)})}})
+    assert list(flatten_indicator_data(payload)) == [("BRA", "SP.POP", 2000, 10.0), ("BRA", "SP.POP", 2001, 11.5)]
+
+
+def test_record_list_series():
+    payload = indicator_payload({"IND": {"X": [{"date": "2018", "value": 3}, {"year": 2019, "value": atom(4)},
+                                              {"value": 5}, "not a record", {"date": "n/a", "value": 6}]}})
+    assert list(flatten_indicator_data(payload)) == [("IND", "X", 2018, 3.0), ("IND", "X", 2019, 4.0)]
+
+
+def test_skips_bool_non_numeric_missing_values_and_non_year_keys():
+    payload = indicator_payload({"IND": {"X": {"2000": True, "2001": "12", "2002": None, "2003": atom(None),
+                                               "2004": {"$type": "atom"}, "latest": 7, "2005": 0}}})
+    assert list(flatten_indicator_data(payload)) == [("IND", "X", 2005, 0.0)]
+
+
+def test_missing_or_malformed_payloads_yield_nothing():
+    for payload in (None, {}, {"jsonGraph": None}, {"jsonGraph": {"indicatorData": None}}, indicator_payload({"IND": None})):
+        assert list(flatten_indicator_data(payload)) == []
+
+
+def test_indicator_rows_keep_only_the_requested_country():
+    payload = indicator_payload({"ind": {"X": {"2000": 1}}, "BRA": {"X": {"2000": 2}}})
+    assert CountryService._indicator_rows("IND", payload) == [
+        {"country_code": "IND", "indicator": "X", "year": 2000, "value": 1.0},
+    ]
+
+
+def test_indicator_rows_collapse_repeated_years():
+    payload = indicator_payload({"IND": {"X": [{"date": "2000", "value": 1}, {"date": "2000", "value": 2}]}})
+    assert CountryService._indicator_rows("IND", payload) == [
+        {"country_code": "IND", "indicator": "X", "year": 2000, "value": 2.0},
+    ]
@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+import random
+import zlib
+
+import pytest
+
+from app.services import payload_codec
+
+
+def random_json(rng: random.Random, size: int) -> bytes:
+    values = {f"k{i}": rng.choice([rng.random(), "x" * rng.randrange(20), None, [i, i * 2]]) for i in range(size // 16 + 1)}
+    return json.dumps(values).encode()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_crc32_combine_matches_crc_of_concatenation(seed):
+    rng = random.Random(seed)
+    a = os.urandom(rng.randrange(0, 5000))
+    b = os.urandom(rng.choice([0, 1, rng.randrange(2, 70000)]))
+    assert payload_codec.crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)) == zlib.crc32(a + b)
+
+
+def test_crc32_combine_with_multi_megabyte_suffix():
+    a, b = os.urandom(100), os.urandom(3 * 1024 * 1024 + 7)
+    assert payload_codec.crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)) == zlib.crc32(a + b)
+
+
+@pytest.mark.parametrize("size", [0, 1, 1000, 300_000])
+def test_encode_decode_round_trip(size):
+    text = random_json(random.Random(size), size)
+    blob = payload_codec.encode(text)
+    assert payload_codec.decode(blob) == text
+    assert payload_codec.uncompressed_size(blob) == len(text)
+    assert b"".join(payload_codec.iter_decode(blob, chunk_size=1024)) == text
+    assert all(len(chunk) <= 1024 for chunk in payload_codec.iter_decode(blob, chunk_size=1024))
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        payload_codec.decode(b"\x09whatever")
+    with pytest.raises(ValueError):
+        payload_codec.uncompressed_size(b"")
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_gzip_document_is_one_valid_member_matching_identity(seed):
+    rng = random.Random(seed)
+    texts = [random_json(rng, rng.choice([0, 10, 5000, 200_000])) for _ in range(rng.randrange(1, 6))]
+    parts = ['{"id": 1, "data": {']
+    for i, text in enumerate(texts):
+        parts.append(f'{", " if i else ""}"p{i}": ')
+        parts.append(payload_codec.encode(text))
+    parts.append("}}")
+
+    identity = b"".join(payload_codec.iter_document(parts, gzip=False))
+    compressed = b"".join(payload_codec.iter_document(parts, gzip=True))
+
+    assert json.loads(identity)["data"] == {f"p{i}": json.loads(text) for i, text in enumerate(texts)}
+    assert gzip.decompress(compressed) == identity
+    # A single gzip member: clients that stop after the first member (as httpx does) must still see everything.
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decompressor.decompress(compressed) == identity
+    assert decompressor.eof and not decompressor.unused_data
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("gzip", True),
+    ("br, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("identity", False),
+    ("*", True),
+    ("*;q=0", False),
+    ("*;q=1, gzip;q=0", False),
+    ("gzip;q=0, *", False),
+    ("*;q=0, x-gzip", True),
+])
+def test_accepts_gzip(header, expected):
+    assert payload_codec.accepts_gzip(header) is expected
@@ -0,0 +1,76 @@
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+
+async def collect(flight):
+    return [event async for event in flight.subscribe()]
+
+
+def test_late_joiners_replay_every_event():
+    async def scenario():
+        flights = SingleFlight()
+        step = asyncio.Event()
+        runs = 0
+
+        async def producer():
+            nonlocal runs
+            runs += 1
+            yield 1
+            yield 2
+            await step.wait()
+            yield 3
+
+        first = flights.join("IND", producer)
+        early = asyncio.create_task(collect(first))
+        while len(first.events) < 2:
+            await asyncio.sleep(0)
+        # Joins after two events were published, but before the run finished.
+        late = flights.join("IND", producer)
+        assert late is first
+        late_events = asyncio.create_task(collect(late))
+        step.set()
+        assert await early == [1, 2, 3]
+        assert await late_events == [1, 2, 3]
+        # A subscriber arriving after completion still gets the whole history.
+        assert await collect(first) == [1, 2, 3]
+        assert runs == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_run_publishes_an_error_event_and_releases_the_key():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def failing():
+            yield {"progress": 10}
+            raise RuntimeError("upstream down")
+
+        events = await collect(flights.join("IND", failing))
+        assert events == [{"progress": 10}, {"progress": 100, "status": "Error", "error": "upstream down"}]
+
+        async def succeeding():
+            yield {"progress": 100}
+
+        # The failed run no longer owns the key, so the next caller starts a fresh one.
+        assert await collect(flights.join("IND", succeeding)) == [{"progress": 100}]
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_run_independently():
+    async def scenario():
+        flights = SingleFlight()
+
+        def producer(key):
+            async def run():
+                yield key
+            return run
+
+        first, second = flights.join("IND", producer("IND")), flights.join("BRA", producer("BRA"))
+        assert first is not second
+        assert await collect(first) == ["IND"]
+        assert await collect(second) == ["BRA"]
+
+    asyncio.run(scenario())